@@ -0,0 +1,4 @@
+"""
+Benchmarks, run with airspeed velocity (asv).
+
+"""
@@ -0,0 +1,52 @@
+"""
+Benchmarks for the sparse array helpers.
+
+"""
+import numpy as np
+
+from sklearn_hierarchical_classification.array import apply_rollup_Xy, apply_rollup_Xy_raw, extract_rows_csr
+
+from .common import RANDOM_STATE, make_dataset, make_tree
+
+
+class ExtractRowsSuite(object):
+    """Extract a subset of rows out of a csr matrix."""
+
+    params = ([10000, 100000], [0.005, 0.05], [0.1, 0.5])
+    param_names = ["n_samples", "density", "fraction"]
+
+    def setup(self, n_samples, density, fraction):
+        rng = np.random.RandomState(RANDOM_STATE)
+        self.X, _ = make_dataset(make_tree(depth=1, branching=10), n_samples=n_samples, density=density)
+        self.rows = np.sort(rng.choice(n_samples, size=int(fraction * n_samples), replace=False))
+
+    def time_extract_rows_csr(self, n_samples, density, fraction):
+        extract_rows_csr(self.X, self.rows)
+
+    def time_extract_rows_csr_compact(self, n_samples, density, fraction):
+        extract_rows_csr(self.X, self.rows, compact=True)
+
+
+class ApplyRollupSuite(object):
+    """Expand rows of a csr matrix whose samples are rolled up into one or more labels."""
+
+    params = ([10000, 100000], [1, 2, 3])
+    param_names = ["n_samples", "max_labelset_size"]
+
+    def setup(self, n_samples, max_labelset_size):
+        rng = np.random.RandomState(RANDOM_STATE)
+        self.X, _ = make_dataset(make_tree(depth=1, branching=10), n_samples=n_samples)
+        self.y = [
+            list(range(size))
+            for size in rng.randint(1, max_labelset_size + 1, size=n_samples)
+        ]
+        self.documents = ["document {}".format(i) for i in range(n_samples)]
+
+    def time_apply_rollup_Xy(self, n_samples, max_labelset_size):
+        apply_rollup_Xy(self.X, self.y)
+
+    def time_apply_rollup_Xy_raw(self, n_samples, max_labelset_size):
+        apply_rollup_Xy_raw(self.documents, self.y)
+
+    def peakmem_apply_rollup_Xy_raw(self, n_samples, max_labelset_size):
+        apply_rollup_Xy_raw(self.documents, self.y)
@@ -0,0 +1,77 @@
+"""
+Benchmarks for fitting and predicting with the hierarchical classifier.
+
+"""
+from sklearn.linear_model import LogisticRegression
+
+from sklearn_hierarchical_classification.classifier import HierarchicalClassifier
+
+from .common import make_dag, make_dataset, make_tree
+
+
+def make_classifier(graph):
+    return HierarchicalClassifier(
+        base_estimator=LogisticRegression(solver="liblinear"),
+        class_hierarchy=graph,
+    )
+
+
+class HierarchyShapeSuite(object):
+    """Fit and predict on hierarchies of increasing depth, branching factor and DAG density."""
+
+    params = ([2, 3, 4], [3, 6], [0., 0.1])
+    param_names = ["depth", "branching", "dag_density"]
+    timeout = 300
+
+    def setup(self, depth, branching, dag_density):
+        if branching ** depth > 1000:
+            # Skip hierarchies with too many leaves for a benchmark run
+            raise NotImplementedError()
+
+        graph = make_dag(depth, branching, dag_density) if dag_density else make_tree(depth, branching)
+        self.X, self.y = make_dataset(graph, n_samples=5000)
+        self.graph = graph
+        self.clf = make_classifier(graph).fit(self.X, self.y)
+
+    def time_fit(self, depth, branching, dag_density):
+        make_classifier(self.graph).fit(self.X, self.y)
+
+    def peakmem_fit(self, depth, branching, dag_density):
+        make_classifier(self.graph).fit(self.X, self.y)
+
+    def time_predict(self, depth, branching, dag_density):
+        self.clf.predict(self.X)
+
+    def time_predict_proba(self, depth, branching, dag_density):
+        self.clf.predict_proba(self.X)
+
+
+class DatasetShapeSuite(object):
+    """Fit and predict on datasets of increasing size, density and number of classes."""
+
+    params = ([1000, 10000], [0.005, 0.05], [10, 100])
+    param_names = ["n_samples", "density", "n_classes"]
+    timeout = 300
+
+    def setup(self, n_samples, density, n_classes):
+        # Two-level tree, with (about) n_classes leaves
+        branching = int(round(n_classes ** 0.5))
+        graph = make_tree(depth=2, branching=branching)
+        self.X, self.y = make_dataset(graph, n_samples=n_samples, density=density)
+        self.graph = graph
+        self.clf = make_classifier(graph).fit(self.X, self.y)
+
+    def time_fit(self, n_samples, density, n_classes):
+        make_classifier(self.graph).fit(self.X, self.y)
+
+    def peakmem_fit(self, n_samples, density, n_classes):
+        make_classifier(self.graph).fit(self.X, self.y)
+
+    def time_predict(self, n_samples, density, n_classes):
+        self.clf.predict(self.X)
+
+    def time_predict_proba(self, n_samples, density, n_classes):
+        self.clf.predict_proba(self.X)
+
+    def track_nnz(self, n_samples, density, n_classes):
+        return self.X.nnz
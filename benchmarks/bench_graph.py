@@ -0,0 +1,34 @@
+"""
+Benchmarks for the class hierarchy graph helpers.
+
+"""
+import numpy as np
+
+from sklearn_hierarchical_classification.constants import ROOT
+from sklearn_hierarchical_classification.graph import HierarchyIndex, rollup_nodes, terminal_nodes
+
+from .common import RANDOM_STATE, make_dag, make_tree
+
+
+class RollupNodesSuite(object):
+    """Roll up leaf targets into the children of the root node."""
+
+    params = ([2, 4], [4, 8], [0., 0.1], [10000, 100000])
+    param_names = ["depth", "branching", "dag_density", "n_samples"]
+
+    def setup(self, depth, branching, dag_density, n_samples):
+        rng = np.random.RandomState(RANDOM_STATE)
+        self.graph = make_dag(depth, branching, dag_density) if dag_density else make_tree(depth, branching)
+        self.index = HierarchyIndex(self.graph)
+
+        leaves = np.array(sorted(terminal_nodes(self.graph)))
+        self.targets = leaves[rng.randint(len(leaves), size=n_samples)]
+
+    def time_rollup_nodes(self, depth, branching, dag_density, n_samples):
+        rollup_nodes(self.graph, source=ROOT, targets=self.targets)
+
+    def time_rollup_nodes_with_index(self, depth, branching, dag_density, n_samples):
+        rollup_nodes(self.graph, source=ROOT, targets=self.targets, index=self.index)
+
+    def time_build_index(self, depth, branching, dag_density, n_samples):
+        HierarchyIndex(self.graph)
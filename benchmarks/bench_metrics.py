@@ -0,0 +1,29 @@
+"""
+Benchmarks for the hierarchical metrics.
+
+"""
+import numpy as np
+
+from sklearn_hierarchical_classification.graph import terminal_nodes
+from sklearn_hierarchical_classification.metrics import h_fbeta_score
+
+from .common import RANDOM_STATE, binarize, make_dag, make_tree
+
+
+class HierarchicalFScoreSuite(object):
+    """Compute the hierarchical F1 score of random predictions."""
+
+    params = ([2, 4], [4, 8], [0., 0.1], [10000, 100000])
+    param_names = ["depth", "branching", "dag_density", "n_samples"]
+
+    def setup(self, depth, branching, dag_density, n_samples):
+        rng = np.random.RandomState(RANDOM_STATE)
+        self.graph = make_dag(depth, branching, dag_density) if dag_density else make_tree(depth, branching)
+
+        n_classes = self.graph.number_of_nodes() - 1
+        leaves = np.array(sorted(terminal_nodes(self.graph)))
+        self.y_true = binarize(leaves[rng.randint(len(leaves), size=n_samples)], n_classes)
+        self.y_pred = binarize(leaves[rng.randint(len(leaves), size=n_samples)], n_classes)
+
+    def time_h_fbeta_score(self, depth, branching, dag_density, n_samples):
+        h_fbeta_score(self.y_true, self.y_pred, self.graph)
@@ -0,0 +1,49 @@
+"""
+Synthetic class hierarchies and datasets for benchmarks.
+
+"""
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from sklearn_hierarchical_classification.datasets import make_hierarchical_dataset, make_hierarchy
+
+
+RANDOM_STATE = 42
+
+
+def make_tree(depth, branching):
+    """Create a balanced tree class hierarchy, see `make_hierarchy`."""
+    return make_hierarchy(depth, branching)
+
+
+def make_dag(depth, branching, density, random_state=RANDOM_STATE):
+    """Create a DAG class hierarchy, with given fraction of nodes having an extra parent, see `make_hierarchy`."""
+    return make_hierarchy(depth, branching, multi_parent_rate=density, random_state=random_state)
+
+
+def make_dataset(graph, n_samples, n_features=1000, density=0.01, random_state=RANDOM_STATE):
+    """
+    Create a sparse dataset, with each sample labeled by a leaf of given class hierarchy,
+    see `make_hierarchical_dataset`.
+
+    Parameters
+    ----------
+    density : float
+        Approximate fraction of non-zero features of each sample.
+
+    """
+    return make_hierarchical_dataset(
+        graph,
+        n_samples,
+        n_features=n_features,
+        n_tokens=max(int(density * n_features), 1),
+        random_state=random_state,
+    )
+
+
+def binarize(y, n_classes):
+    """Binarize single-label integer targets into a sparse indicator matrix."""
+    return csr_matrix(
+        (np.ones(len(y), dtype=np.int8), np.asarray(y, dtype=np.intp), np.arange(len(y) + 1)),
+        shape=(len(y), n_classes),
+    )
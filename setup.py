@@ -19,6 +19,7 @@ setup(
     include_package_data=True,
     zip_safe=False,
     install_requires=[
+        "joblib>=0.12",
         "networkx>=2.4",
         "numpy>=1.13.1",
         "scikit-learn>=0.19.0",
@@ -1,4 +1,5 @@
 """Helpers for workings with sequences and (numpy) arrays."""
+from collections.abc import Sequence
 from itertools import chain
 
 import numpy as np
@@ -32,6 +33,116 @@ def apply_along_rows(func, X):
         )
 
 
+class RowsView(Sequence):
+    """
+    Read-only view of given rows of a sequence of raw examples (e.g a list of text documents), in given order.
+
+    Examples are looked up in the underlying sequence on access, rather than copied, so that selecting
+    (possibly repeated) rows out of a large corpus only takes an array of row indices.
+    Indexing a view with a slice or an array of indices returns a view of the same underlying sequence.
+
+    Parameters
+    ----------
+    X : sequence
+        The raw examples.
+
+    rows : array-like of row ids
+        Indices of the examples of X in the view.
+
+    """
+
+    def __init__(self, X, rows):
+        rows = np.asarray(rows, dtype=np.intp)
+        if isinstance(X, RowsView):
+            X, rows = X.X, X.rows[rows]
+
+        self.X = X
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, ix):
+        if isinstance(ix, slice) or np.ndim(ix) > 0:
+            return RowsView(self.X, self.rows[ix])
+
+        return self.X[self.rows[ix]]
+
+    def __iter__(self):
+        X = self.X
+        return (X[ix] for ix in self.rows.tolist())
+
+
+def take_rows(X, rows):
+    """
+    Select given rows (samples) out of X, in given order.
+
+    X can be a (sparse) matrix, or a sequence of raw examples (e.g a list of text documents) when working with
+    raw data, in which case a `RowsView` of the selected examples is returned.
+
+    """
+    if hasattr(X, "shape"):
+        return X[rows]
+
+    return RowsView(X, rows)
+
+
+def rollup_rows(y):
+    """
+    Return the row indices for 'flattening' out given rolled-up targets.
+
+    Parameters
+    ----------
+    y : list-of-lists - [n_samples]
+        For each sample, y maintains list of labels this sample should be used for in training.
+
+    Returns
+    -------
+    rows : array-like, shape = [n_labels]
+        Index of the sample of each label in y, i.e each row repeated once per label in its labelset.
+
+    """
+    labelset_sizes = np.fromiter((len(labelset) for labelset in y), dtype=np.intp, count=len(y))
+    return np.repeat(np.arange(len(y)), labelset_sizes)
+
+
+def group_by(keys):
+    """
+    Group the positions of given (integer) keys by key value.
+
+    Returns
+    -------
+    groups : list of (key, positions) tuples, in increasing key order.
+
+    """
+    keys = np.asarray(keys)
+    order = np.argsort(keys, kind="stable")
+    unique_keys, starts = np.unique(keys[order], return_index=True)
+    return list(zip(unique_keys, np.split(order, starts[1:])))
+
+
+def rank_by_group(keys, scores):
+    """
+    Rank elements within groups of equal (integer) keys, by decreasing score.
+
+    Returns
+    -------
+    ranks : array-like, shape = [n_elements]
+        For each element, its rank within its group, starting from 0 for the highest scoring element.
+
+    """
+    keys, scores = np.asarray(keys), np.asarray(scores)
+    order = np.lexsort((-scores, keys))
+    sorted_keys = keys[order]
+    positions = np.arange(len(order))
+    group_starts = np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1]))
+    first_in_group = np.maximum.accumulate(np.where(group_starts, positions, 0))
+
+    ranks = np.empty(len(order), dtype=np.intp)
+    ranks[order] = positions - first_in_group
+    return ranks
+
+
 def apply_rollup_Xy(X, y):
     """
     Parameters
@@ -48,10 +159,11 @@ def apply_rollup_Xy(X, y):
         Transformed by 'flattening' out y parameter and duplicating corresponding rows in X
 
     """
-    # Compute number of rows we will have after transformation
-    n_rows = sum(len(labelset) for labelset in y)
+    # Our goal is to expand the equal labelsets into their own row within X
+    # We do this by repeating each row exactly "labelset" times
+    rows = rollup_rows(y)
 
-    if n_rows == X.shape[0]:
+    if len(rows) == len(y) and np.all(rows == np.arange(len(y))):
         # No expansion needed
         return X, flatten_list(y)
 
@@ -59,41 +171,18 @@ def apply_rollup_Xy(X, y):
         # Performance improvements require csr matrix
         X = csr_matrix(X)
 
-    indptr = np.zeros((n_rows+1), dtype=np.int32)
-    indices = []
-    data = []
-
-    indices_count = 0
-    offset = 0
-
-    # Our goal is to expand the equal labelsets into their own row within X
-    # We do this by repeating each row exactly "labelset" times
-    for i, labelset in enumerate(y):
-        labelset_sz = len(labelset)
-        for j in range(labelset_sz):
-            indptr[offset+j] = indices_count
-
-            indices.append(X.indices[X.indptr[i]:X.indptr[i+1]])
-            data.append(X.data[X.indptr[i]:X.indptr[i+1]])
-
-            indices_count += len(X.data[X.indptr[i]:X.indptr[i+1]])
-
-        offset += labelset_sz
-
-    indptr[-1] = indices_count
-
-    indices = np.concatenate(indices)
-    data = np.concatenate(data)
+    X_ = gather_rows_csr(X, rows)
 
     y_ = flatten_list(y)
-    return csr_matrix((data, indices, indptr), shape=(n_rows, X.shape[1]), dtype=X.dtype), y_
+    return X_, y_
 
 
 def apply_rollup_Xy_raw(X, y):
     """
     Parameters
     ----------
-    X : List
+    X : sequence
+        Raw examples, e.g a list of text documents.
 
     y : list-of-lists - [n_samples]
         For each sample, y maintains list of labels this sample should be used for in training.
@@ -101,29 +190,20 @@ def apply_rollup_Xy_raw(X, y):
     Returns
     -------
     X_, y_
-        Transformed by 'flattening' out y parameter and duplicating corresponding rows in X
+        Transformed by 'flattening' out y parameter and repeating corresponding examples in X.
+        Examples are not copied, X_ is a `RowsView` of X (or X itself when no expansion is needed).
 
     """
-    # Compute number of rows we will have after transformation
-    n_rows = sum(len(labelset) for labelset in y)
+    rows = rollup_rows(y)
 
-    if n_rows == X.shape[0]:
+    if len(rows) == len(y) and np.all(rows == np.arange(len(y))):
         # No expansion needed
         return X, flatten_list(y)
 
-    # Our goal is to expand the equal labelsets into their own row within X
-    # We do this by repeating each row exactly "labelset" times
-    X_rows = []
-    for i, labelset in enumerate(y):
-        labelset_sz = len(labelset)
-        for j in range(labelset_sz):
-            X_rows.append(X[j])
-
-    y_ = flatten_list(y)
-    return X_rows, y_
+    return RowsView(X, rows), flatten_list(y)
 
 
-def extract_rows_csr(matrix, rows):
+def extract_rows_csr(matrix, rows, compact=False):
     """
     Parameters
     ----------
@@ -131,41 +211,83 @@ def extract_rows_csr(matrix, rows):
 
     rows : list of row ids
 
+    compact : bool
+        If set, only the desired rows are kept in the returned matrix, and the indices of
+        the rows they were extracted from are returned along with it.
+        Otherwise, the returned matrix has the same shape as `matrix`, with all other rows zeroed out.
+
     Returns
     -------
     matrix_: (sparse) csr_matrix
         Transformed by extracting the desired rows from `matrix`
 
+    rows_ : array-like, shape = [n_rows_]
+        Only returned when `compact` is set. The (sorted) row ids in `matrix` of each row in `matrix_`.
+
     """
     if not isinstance(matrix, csr_matrix):
         matrix = csr_matrix(matrix)
 
+    rows = np.unique(np.asarray(rows, dtype=np.intp))
+
+    if compact:
+        return gather_rows_csr(matrix, rows), rows
+
     # Short circuit if we want a blank matrix
     if len(rows) == 0:
         return csr_matrix(matrix.shape)
 
-    # Keep a record of the desired rows
-    indptr = np.zeros(matrix.indptr.shape, dtype=np.int32)
-    indices = []
-    data = []
+    # Only the desired rows keep their non-zero entries, all other rows become empty
+    row_nnz = np.zeros(matrix.shape[0], dtype=matrix.indptr.dtype)
+    row_nnz[rows] = np.diff(matrix.indptr)[rows]
+    indptr = np.concatenate(([0], np.cumsum(row_nnz))).astype(matrix.indptr.dtype)
 
-    # Keep track of the current index pointer
-    indices_count = 0
+    positions = _csr_rows_positions(matrix, rows)
 
-    for i in range(matrix.shape[0]):
-        indptr[i] = indices_count
+    return csr_matrix(
+        (matrix.data[positions], matrix.indices[positions], indptr),
+        shape=matrix.shape,
+    )
 
-        if i in rows:
-            indices.append(matrix.indices[matrix.indptr[i]:matrix.indptr[i+1]])
-            data.append(matrix.data[matrix.indptr[i]:matrix.indptr[i+1]])
-            indices_count += len(matrix.data[matrix.indptr[i]:matrix.indptr[i+1]])
 
-    indptr[-1] = indices_count
+def gather_rows_csr(matrix, rows):
+    """
+    Build a new csr_matrix out of given rows of `matrix`, in given order.
+    Rows can be repeated, in which case they are duplicated in the returned matrix.
+
+    This runs in time linear in the number of non-zero entries of the selected rows.
+
+    Parameters
+    ----------
+    matrix : (sparse) csr_matrix
 
-    indices = np.concatenate(indices)
-    data = np.concatenate(data)
+    rows : array-like of row ids
 
-    return csr_matrix((data, indices, indptr), shape=matrix.shape)
+    Returns
+    -------
+    matrix_: (sparse) csr_matrix, shape = [len(rows), matrix.shape[1]]
+
+    """
+    rows = np.asarray(rows, dtype=np.intp)
+    row_nnz = np.diff(matrix.indptr)[rows]
+    indptr = np.concatenate(([0], np.cumsum(row_nnz))).astype(matrix.indptr.dtype)
+
+    positions = _csr_rows_positions(matrix, rows)
+
+    return csr_matrix(
+        (matrix.data[positions], matrix.indices[positions], indptr),
+        shape=(len(rows), matrix.shape[1]),
+        dtype=matrix.dtype,
+    )
+
+
+def _csr_rows_positions(matrix, rows):
+    """Return the positions into `matrix.data` / `matrix.indices` of the entries of given rows, in order."""
+    starts = matrix.indptr[rows]
+    row_nnz = matrix.indptr[rows + 1] - starts
+    # Offset of each row's first entry in the output, subtracted from its position in the input
+    shifts = starts - (np.cumsum(row_nnz) - row_nnz)
+    return np.arange(row_nnz.sum(), dtype=np.intp) + np.repeat(shifts, row_nnz)
 
 
 def nnz_rows_ix(X):
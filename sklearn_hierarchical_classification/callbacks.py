@@ -0,0 +1,46 @@
+"""
+Callbacks invoked around the training and prediction of local classifiers.
+
+"""
+
+
+class NodeCallback(object):
+    """
+    Base class for callbacks, see the `callbacks` parameter of `HierarchicalClassifier`.
+
+    Sub-classes can override any of the methods below, e.g for profiling or exporting metrics for every node.
+    Callbacks do not need to derive from this class, any object implementing some of these methods can be used.
+
+    When local classifiers are trained in parallel (see the `n_jobs` parameter), the `on_node_fit_*` methods
+    are called by the worker training the local classifier, which is a separate process for process-based
+    joblib backends.
+
+    """
+
+    def on_node_fit_start(self, node_id, X_shape, y_shape):
+        """Called right before fitting the local classifier for given node on data of given shapes."""
+
+    def on_node_fit_end(self, node_id, X_shape, y_shape, elapsed):
+        """Called right after fitting the local classifier for given node, with the elapsed time (in seconds)."""
+
+    def on_node_predict(self, node_id, X_shape, elapsed):
+        """
+        Called after scoring data of given shape with the local classifier for given node.
+
+        Not called when fused inference is enabled (see `HierarchicalClassifier.compile`), since the local
+        classifiers are then not scored individually.
+
+        """
+
+
+def run_callbacks(callbacks, event, **kwargs):
+    """Call the method for given event on each of the callbacks implementing it."""
+    for callback in callbacks or ():
+        method = getattr(callback, event, None)
+        if method is not None:
+            method(**kwargs)
+
+
+def data_shape(X):
+    """Return the shape of given data, which is the number of samples for raw data (e.g a list of documents)."""
+    return X.shape if hasattr(X, "shape") else (len(X),)
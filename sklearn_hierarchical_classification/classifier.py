@@ -2,9 +2,12 @@
 Hierarchical classifier interface.
 
 """
+from functools import partial
+
 import numpy as np
-from networkx import DiGraph, is_tree
-from scipy.sparse import csr_matrix
+from joblib import Parallel, delayed, effective_n_jobs, hash as joblib_hash
+from networkx import DiGraph, dfs_preorder_nodes, is_tree
+from scipy.sparse import csr_matrix, issparse
 from sklearn.base import (
     BaseEstimator,
     ClassifierMixin,
@@ -18,29 +21,111 @@ from sklearn.utils.validation import (
     check_array,
     check_consistent_length,
     check_is_fitted,
+    check_memory,
     check_X_y,
+    _num_samples,
 )
 
+from sklearn_hierarchical_classification import persistence
 from sklearn_hierarchical_classification.array import (
-    apply_along_rows,
     apply_rollup_Xy,
-    apply_rollup_Xy_raw,
     extract_rows_csr,
     flatten_list,
-    nnz_rows_ix,
+    gather_rows_csr,
+    group_by,
+    rank_by_group,
+    rollup_rows,
+    take_rows,
 )
+from sklearn_hierarchical_classification.callbacks import data_shape, run_callbacks
 from sklearn_hierarchical_classification.constants import (
     CLASSIFIER,
     DEFAULT,
+    FINGERPRINT,
     METAFEATURES,
     ROOT,
+    TRAINING_ROWS,
 )
 from sklearn_hierarchical_classification.decorators import logger
 from sklearn_hierarchical_classification.dummy import DummyProgress
-from sklearn_hierarchical_classification.graph import make_flat_hierarchy, rollup_nodes
+from sklearn_hierarchical_classification.graph import HierarchyIndex, make_flat_hierarchy, rollup_nodes
+from sklearn_hierarchical_classification.plan import FUSED_BATCH_SIZE, InferencePlan
+from sklearn_hierarchical_classification.stats import (
+    FIT_STATS_FIELDS,
+    PREDICT_STATS_FIELDS,
+    NodeStats,
+    data_stats,
+    measure,
+)
 from sklearn_hierarchical_classification.validation import is_estimator, validate_parameters
 
 
+# Maximum number of rows of the training data sampled into its token, see `_data_token`
+DATA_TOKEN_SAMPLES = 1000
+
+
+def _data_token(X):
+    """
+    Compute a token identifying training data, for fingerprinting the training sets of local classifiers.
+
+    Rather than hashing all of X, the token covers its type, shape, number of non-zero entries and a sample of
+    (up to `DATA_TOKEN_SAMPLES`) evenly spaced rows of it, so that it is cheap to compute on large datasets.
+
+    """
+    n_samples = _num_samples(X)
+    rows = np.unique(np.linspace(0, n_samples - 1, num=min(n_samples, DATA_TOKEN_SAMPLES)).astype(np.intp))
+    sample = X[rows] if hasattr(X, "shape") else [X[ix] for ix in rows]
+
+    return joblib_hash((
+        type(X).__name__,
+        getattr(X, "shape", n_samples),
+        getattr(X, "dtype", None),
+        getattr(X, "nnz", None),
+        sample,
+    ))
+
+
+def _slice_scores(scores, local_indptr, slot, rows):
+    """Slice the scores of the local classifier in given slot out of the fused scores of all local classifiers."""
+    return scores[rows, local_indptr[slot]:local_indptr[slot + 1]]
+
+
+def _fit_estimator(clf, X, y, fingerprint=None):
+    """Fit an estimator. The fingerprint identifies its training set when caching fitted estimators."""
+    return clf.fit(X=X, y=y)
+
+
+def _fit_transform(transformer, X, y):
+    """Fit a transformer and transform the data it was fitted on. Returns the transformed data and the transformer."""
+    return transformer.fit_transform(X, y), transformer
+
+
+def _fit_local_classifier(
+    node_id,
+    clf,
+    X,
+    y,
+    fit=_fit_estimator,
+    fingerprint=None,
+    callbacks=None,
+    trace_memory=True,
+):
+    """
+    Fit a local classifier, for use as a (parallel) joblib task. Also returns the time and memory it took,
+    the latter only being measured if `trace_memory` is set, see `measure`.
+
+    """
+    shapes = dict(X_shape=data_shape(X), y_shape=np.shape(y))
+    run_callbacks(callbacks, "on_node_fit_start", node_id=node_id, **shapes)
+
+    with measure(trace_memory=trace_memory) as stats:
+        clf = fit(clf, X, y, fingerprint=fingerprint)
+
+    run_callbacks(callbacks, "on_node_fit_end", node_id=node_id, elapsed=stats["time"], **shapes)
+
+    return node_id, clf, stats
+
+
 @logger
 class HierarchicalClassifier(BaseEstimator, ClassifierMixin, MetaEstimatorMixin):
     """Hierarchical classification strategy
@@ -152,11 +237,75 @@ class HierarchicalClassifier(BaseEstimator, ClassifierMixin, MetaEstimatorMixin)
         feature matrix X and return a set of per-sample scores, corresponding to each label. Setting this to True
         would attempt to use this method when it is exposed by the base classifier.
 
+    n_jobs : int or None
+        The number of jobs to use for training the local classifiers in parallel.
+        None means 1 unless in a `joblib.parallel_backend` context, -1 means using all processors.
+        The `joblib.parallel_backend` context manager can also be used to choose between process-based
+        and thread-based parallelism. When running in parallel, local classifiers are dispatched in decreasing
+        order of their number of training samples.
+
+    proba_mode : "path", "marginal"
+        Determines the probability estimates returned by `predict_proba`.
+        When set to "path" (the default), only the classes considered along the prediction path of each sample
+        are assigned a probability, being the probability estimate of the local classifier at their parent node.
+        When set to "marginal", every class is assigned its marginal probability, i.e the product of the local
+        probability estimates along the path from the root to it (summed over all such paths in a DAG).
+
+    memory : None, str or object with the joblib.Memory interface
+        Used to cache the fitted local classifiers. By default, no caching is performed. If a string is given,
+        it is the path to the caching directory.
+        Fitted local classifiers are looked up by a fingerprint of their training set, which covers the training
+        data, the training rows and targets of the node, the roll-up of these targets into the node's children and
+        the (unfitted) base estimator and its parameters. Re-fitting with only a few base estimators changed thus only
+        re-trains the nodes using them. The cache is looked up before materializing the training data of a node,
+        which is skipped on a cache hit. The training data is identified by a token, see the `data_token`
+        parameter of `fit`.
+
+    keep_training_data : bool
+        Whether to keep the training set of each node (the indices of its training rows) on the nodes of `graph_`
+        after fitting. When set to False, the training set of each node is released as soon as the training data
+        for its local classifier has been determined, and only its metafeatures and fingerprint are kept.
+
+    callbacks : list or None
+        Callback objects, called around the training and prediction of each local classifier, e.g for profiling.
+        Callbacks may implement any of the methods of `NodeCallback` ("on_node_fit_start", "on_node_fit_end",
+        "on_node_predict"), which are passed the node id, the shapes of the data and the elapsed time.
+        "on_node_predict" is not called when fused inference is enabled (see `compile`, also available in raw mode
+        with a `feature_extractor`), since all local classifiers are then scored at once.
+
+    record_predict_stats : bool
+        Whether to record statistics for each node when predicting, see the `predict_stats_` attribute.
+        Recording them updates the fitted classifier on every prediction, and is not thread-safe.
+
+    feature_extractor : transformer object or None
+        A feature extraction stage shared by all local classifiers, e.g a `TfidfVectorizer`, only used when
+        `feature_extraction` is set to "raw". When set, it is fitted once on all the training examples, and the local
+        classifiers are trained on the rows of its output relevant to them, as when `feature_extraction` is set to
+        "preprocessed". The base estimator(s) should then not include feature extraction.
+        At prediction time, each batch of raw examples is transformed once, before being routed through the hierarchy.
+        When `memory` is set, the fitted feature extractor and the features it extracted are cached as well.
+
     Attributes
     ----------
     classes_ : array, shape = [`n_classes`]
         Flat array of class labels
 
+    feature_extractor_ : transformer object or None
+        The fitted shared feature extractor, see the `feature_extractor` parameter.
+
+    fit_stats_ : NodeStats
+        Statistics recorded for each node when fitting: time spent building its training set
+        ("build_features_time") and training its local classifier ("train_time"), the size of the training set
+        ("n_samples", "n_features", "nnz", "data_nbytes") and the peak memory allocated while training
+        ("peak_memory", only recorded when `tracemalloc` is tracing memory allocations and local classifiers are
+        trained serially, since `tracemalloc` only tracks the peak memory of the whole process).
+
+    predict_stats_ : NodeStats
+        Statistics recorded for each node when predicting, accumulated over calls: number of calls to its local
+        classifier ("n_calls"), number of samples scored ("n_samples") and time spent ("predict_time").
+        Only recorded when `record_predict_stats` is set, and not when fused inference is enabled
+        (see `compile`), since all local classifiers are then scored at once.
+
     References
     ----------
 
@@ -179,6 +328,13 @@ class HierarchicalClassifier(BaseEstimator, ClassifierMixin, MetaEstimatorMixin)
         mlb=None,
         mlb_prediction_threshold=0.,
         use_decision_function=False,
+        n_jobs=None,
+        proba_mode="path",
+        memory=None,
+        keep_training_data=True,
+        callbacks=None,
+        feature_extractor=None,
+        record_predict_stats=False,
     ):
         self.estimators_ = {}
         self.base_estimator = base_estimator
@@ -193,8 +349,15 @@ class HierarchicalClassifier(BaseEstimator, ClassifierMixin, MetaEstimatorMixin)
         self.mlb = mlb
         self.mlb_prediction_threshold = mlb_prediction_threshold
         self.use_decision_function = use_decision_function
-
-    def fit(self, X, y=None, sample_weight=None):
+        self.n_jobs = n_jobs
+        self.proba_mode = proba_mode
+        self.memory = memory
+        self.keep_training_data = keep_training_data
+        self.callbacks = callbacks
+        self.feature_extractor = feature_extractor
+        self.record_predict_stats = record_predict_stats
+
+    def fit(self, X, y=None, sample_weight=None, data_token=None):
         """Fit underlying classifiers.
 
         Parameters
@@ -209,53 +372,139 @@ class HierarchicalClassifier(BaseEstimator, ClassifierMixin, MetaEstimatorMixin)
         sample_weight : array-like, shape (n_samples,), optional (default=None)
             Weights applied to individual samples (1. for unweighted).
 
+        data_token : str or None
+            Token identifying the training data, for fingerprinting the training sets of local classifiers
+            (see `refit_affected` and the `memory` parameter). By default, a token is computed from the shape of X
+            and a sample of its rows. Passing e.g a version identifier of the dataset guarantees that changes to
+            any of its rows are detected.
+
         Returns
         -------
         self
 
         """
-        if self.feature_extraction == "raw":
-            # In raw mode, only validate targets (y) format and
-            # that targets and training data (X) are of same cardinality, since
-            # X will in general not be a 2D feature matrix, but rather the raw training examples,
-            # e.g. text snippets or images.
-            y = check_array(
-                y,
-                accept_sparse="csr",
-                force_all_finite=True,
-                ensure_2d=False,
-                dtype=None,
+        X, y = self._check_X_y(X, y)
+        if sample_weight is not None:
+            check_consistent_length(y, sample_weight)
+
+        return self._fit(X, y, data_token=data_token)
+
+    def refit_affected(self, X, y, new_class_hierarchy, data_token=None):
+        """Re-fit underlying classifiers after a change to the class hierarchy.
+
+        Only the local classifiers of nodes whose training set changed (e.g because a class was added below them,
+        or moved into or out of their subtree) are re-trained. Local classifiers of all other nodes are kept as is.
+        A node's training set is identified by a fingerprint of the training data, the rows of it the node
+        is trained on, the roll-up of their targets into the node's children and its (unfitted) local classifier.
+        Fingerprints are computed from the targets alone, so that the training data of nodes whose local
+        classifier is kept is never materialized.
+
+        If the classifier was not fitted before, this is equivalent to fitting it with given class hierarchy.
+
+        The `class_hierarchy` parameter is set to `new_class_hierarchy`, so that subsequent calls to `fit`
+        (and clones of the classifier) use the updated class hierarchy.
+
+        Parameters
+        ----------
+        X : (sparse) array-like, shape = [n_samples, n_features]
+            Data.
+
+        y : (sparse) array-like, shape = [n_samples, ], [n_samples, n_classes]
+            Multi-class targets. An indicator matrix turns on multilabel
+            classification.
+
+        new_class_hierarchy : dict or nx.DiGraph object
+            The updated class hierarchy, replacing the `class_hierarchy` parameter.
+
+        data_token : str or None
+            Token identifying the training data, for fingerprinting the training sets of local classifiers
+            (see `refit_affected` and the `memory` parameter). By default, a token is computed from the shape of X
+            and a sample of its rows. Passing e.g a version identifier of the dataset guarantees that changes to
+            any of its rows are detected.
+
+        Returns
+        -------
+        self
+
+        """
+        X, y = self._check_X_y(X, y)
+
+        reusable = {}
+        if hasattr(self, "graph_"):
+            reusable = {
+                node_id: (data[FINGERPRINT], data[CLASSIFIER])
+                for node_id, data in self.graph_.nodes(data=True)
+                if FINGERPRINT in data and CLASSIFIER in data
+            }
+
+        self.class_hierarchy = new_class_hierarchy
+
+        return self._fit(X, y, reusable=reusable, data_token=data_token)
+
+    def partial_fit(self, X, y, classes=None):
+        """Incrementally fit underlying classifiers on a batch of samples.
+
+        Each batch is routed to the nodes of the hierarchy it is relevant for, and the local classifiers
+        at these nodes are updated by calling their own `partial_fit` method. Base estimators must therefore
+        support incremental learning (e.g `SGDClassifier` or `MultinomialNB`), except at nodes with a single child,
+        which are trivially assigned a constant classifier.
+
+        Only supported when `feature_extraction` is set to "preprocessed", for single-label targets, with
+        the "lcpn" algorithm.
+
+        Local classifiers fitted by `fit` are updated incrementally if they support it and were trained on all the
+        children of their node. Otherwise, e.g at nodes where `fit` only saw a single child and assigned a constant
+        classifier, they are replaced by a new base estimator.
+
+        The inference plan (see `compile`) is re-compiled on the next prediction. Fused inference, if enabled,
+        is thus disabled, and should be enabled again by calling `compile` once done with incremental fitting.
+
+        Parameters
+        ----------
+        X : (sparse) array-like, shape = [n_samples, n_features]
+            Data.
+
+        y : array-like, shape = [n_samples, ]
+            Multi-class targets.
+
+        classes : array-like, shape = [n_classes, ], optional
+            All the target classes that can appear in y. Required on the first call to `partial_fit` when
+            the `class_hierarchy` parameter is not set, and ignored on subsequent calls.
+
+        Returns
+        -------
+        self
+
+        """
+        if self.feature_extraction != "preprocessed" or self.mlb is not None:
+            raise ValueError(
+                "partial_fit() is only supported for single-label targets, "
+                "when 'feature_extraction' is set to \"preprocessed\"."
             )
-            if len(X) != y.shape[0]:
-                raise ValueError("bad input shape: len(X) != y.shape[0]")
-        else:
-            X, y = check_X_y(X, y, accept_sparse="csr")
+        if self.algorithm != "lcpn":
+            raise ValueError("partial_fit() is only supported when 'algorithm' is set to \"lcpn\".")
 
+        X, y = check_X_y(X, y, accept_sparse="csr")
         check_classification_targets(y)
-        if sample_weight is not None:
-            check_consistent_length(y, sample_weight)
 
-        # Check that parameter assignment is consistent
-        self._check_parameters()
+        if not hasattr(self, "graph_"):
+            # First call, initialize class hierarchy
+            self._check_parameters()
+            if self.class_hierarchy is None and classes is None:
+                raise ValueError(
+                    "'classes' must be passed on the first call to partial_fit() when 'class_hierarchy' is not set."
+                )
+            self._init_hierarchy(classes=classes)
 
-        # Initialize NetworkX Graph from input class hierarchy
-        self.class_hierarchy_ = self.class_hierarchy or make_flat_hierarchy(list(np.unique(y)), root=self.root)
-        self.graph_ = DiGraph(self.class_hierarchy_)
-        self.is_tree_ = is_tree(self.graph_)
-        self.classes_ = list(
-            node
-            for node in self.graph_.nodes()
-            if node != self.root
-        )
+        # Integer node id of the target of each sample
+        targets, inverse = np.unique(y, return_inverse=True)
+        y_ix = self.hierarchy_index_.node_indices(targets)[inverse]
 
-        if self.feature_extraction == "preprocessed":
-            # When not in raw mode, recursively build training feature sets for each node in graph
-            with self._progress(total=self.n_classes_ + 1, desc="Building features") as progress:
-                self._recursive_build_features(X, y, node_id=self.root, progress=progress)
+        for node_id in dfs_preorder_nodes(self.graph_, source=self.root):
+            self._partial_fit_local_classifier(X, y, y_ix, node_id)
 
-        # Recursively train base classifiers
-        with self._progress(total=self.n_classes_ + 1, desc="Training base classifiers") as progress:
-            self._recursive_train_local_classifiers(X, y, node_id=self.root, progress=progress)
+        # Inference plan is compiled on the next prediction, rather than after every batch
+        self.plan_ = None
 
         return self
 
@@ -274,23 +523,15 @@ class HierarchicalClassifier(BaseEstimator, ClassifierMixin, MetaEstimatorMixin)
 
         """
         check_is_fitted(self, "graph_")
+        self._check_compiled()
+        X = self._check_predict_input(X)
 
-        def _classify(x):
-            path, _ = self._recursive_predict(x, root=self.root)
-            if self.mlb:
-                return path
-            else:
-                return path[-1]
-
-        if self.feature_extraction == "raw":
-            return np.array([
-                _classify(X[i])
-                for i in range(len(X))
-            ])
-        else:
-            X = check_array(X, accept_sparse="csr")
+        if self.mlb is not None:
+            paths, _ = self._batch_predict_multilabel(X)
+            return paths
 
-        y_pred = apply_along_rows(_classify, X=X)
+        # Route all samples through the hierarchy together rather than one row at a time
+        y_pred, _ = self._batch_predict(X)
         return y_pred
 
     def predict_proba(self, X):
@@ -309,102 +550,337 @@ class HierarchicalClassifier(BaseEstimator, ClassifierMixin, MetaEstimatorMixin)
             order, as they appear in the attribute `classes_`.
         """
         check_is_fitted(self, "graph_")
+        self._check_compiled()
+        X = self._check_predict_input(X)
 
-        def _classify(x):
-            _, scores = self._recursive_predict(x, root=self.root)
-            return scores
-
-        if self.feature_extraction == "raw":
-            return np.array([
-                _classify(X[i])
-                for i in range(len(X))
+        if self.proba_mode == "marginal":
+            return np.concatenate([
+                self._marginal_proba(n_samples=n_samples, local_scores=local_scores)
+                for n_samples, local_scores in self._score_batches(X)
             ])
-        else:
-            X = check_array(X, accept_sparse="csr")
 
-        y_pred = apply_along_rows(_classify, X=X)
-        return y_pred
+        if self.mlb is not None:
+            _, class_proba = self._batch_predict_multilabel(X)
+            return class_proba
+
+        _, class_proba = self._batch_predict(X, with_proba=True)
+        return class_proba
+
+    def predict_topk(self, X, k=5, beam_width=None):
+        """
+        Predict the k most likely classes for each sample, using beam search over paths in the hierarchy.
+
+        Starting from the root, the `beam_width` partial paths with the highest cumulative log-probability
+        are kept for each sample at every level and extended by each of their child nodes, until all paths
+        have reached a node without a classifier. Unlike `predict`, an early mistake in the hierarchy can be
+        recovered from, as long as the correct path stays within the beam. Paths always proceed as far as
+        possible down the hierarchy, i.e the `stopping_criteria` parameter is not applied.
+
+        Parameters
+        ----------
+        X : (sparse) array-like, shape = [n_samples, n_features]
+            Data.
+
+        k : int
+            Number of classes to return for each sample.
+
+        beam_width : int or None
+            Number of partial paths to keep for each sample at every level. Defaults to `k`.
+
+        Returns
+        -------
+        y_topk : array-like, shape = [n_samples, k]
+            The final node of the k best paths of each sample, best first. When fewer than k paths exist
+            for a sample, remaining entries are set to None.
+
+        scores : array-like, shape = [n_samples, k]
+            The log-probability of each path in `y_topk`, being the sum of the log-probabilities reported by
+            the local classifiers along the path, or -inf for missing paths.
+
+        """
+        check_is_fitted(self, "graph_")
+        self._check_compiled()
+        beam_width = beam_width or k
+        if beam_width < k:
+            raise ValueError("'beam_width' must be greater than or equal to 'k'.")
+        if self.mlb is not None or self.use_decision_function:
+            raise ValueError("predict_topk() requires single-label classification using probability estimates.")
+
+        X = self._check_predict_input(X)
+
+        y_topk, scores = zip(*(
+            self._beam_search(n_samples=n_samples, local_scores=local_scores, k=k, beam_width=beam_width)
+            for n_samples, local_scores in self._score_batches(X)
+        ))
+        return np.concatenate(y_topk), np.concatenate(scores)
+
+    def compile(self, fuse_linear=False):
+        """
+        Compile the fitted hierarchy into an inference plan.
+
+        The inference plan flattens the class hierarchy and its local classifiers into integer lookup tables
+        (see `InferencePlan`), which are used for routing samples through the hierarchy at prediction time.
+        This is done automatically at the end of `fit`, and only needs to be called again if `graph_`
+        is modified afterwards, or for enabling fused inference.
+
+        Parameters
+        ----------
+        fuse_linear : bool
+            When every local classifier is a linear model (e.g the default `LogisticRegression`), stack their
+            parameters into a single block matrix (see `FusedLinearModel`). The scores of all local classifiers
+            are then computed with a single matrix product per batch of samples, rather than calling
+            each local classifier separately.
+
+        Returns
+        -------
+        self
+
+        """
+        check_is_fitted(self, "graph_")
+        self.plan_ = InferencePlan(
+            graph=self.graph_,
+            root=self.root,
+            classes=self.classes_,
+            mlb=self.mlb,
+        )
+        if fuse_linear:
+            self.plan_.fuse_linear(use_decision_function=self.use_decision_function)
+
+        return self
+
+    def save(self, path):
+        """
+        Save the fitted classifier to a file, in a compact format which can be memory-mapped when loading.
+
+        Training artifacts are dropped, and the class hierarchy is stored as an integer edge list.
+        See `sklearn_hierarchical_classification.persistence.save`.
+
+        Parameters
+        ----------
+        path : str
+            Path to the file to write.
+
+        """
+        check_is_fitted(self, "graph_")
+        self._check_compiled()
+        persistence.save(self, path)
+
+    @classmethod
+    def load(cls, path, mmap_mode="r"):
+        """
+        Load a classifier saved with `save`.
+
+        See `sklearn_hierarchical_classification.persistence.load`.
+
+        Parameters
+        ----------
+        path : str
+            Path to the file to read.
+
+        mmap_mode : None, "r+", "r", "w+", "c"
+            Memory-mapping mode for the parameters of the local classifiers, see `numpy.load`.
+            Defaults to read-only memory mapping, use None to read everything into memory.
+
+        Returns
+        -------
+        clf : HierarchicalClassifier
+
+        """
+        clf = persistence.load(path, mmap_mode=mmap_mode)
+        if not isinstance(clf, cls):
+            raise TypeError("Loaded classifier of type {} is not a {}.".format(type(clf).__name__, cls.__name__))
+
+        return clf
 
     @property
     def n_classes_(self):
         return len(self.classes_)
 
+    def _check_X_y(self, X, y):
+        """Validate training data and targets."""
+        if self.feature_extraction == "raw":
+            # In raw mode, only validate targets (y) format and
+            # that targets and training data (X) are of same cardinality, since
+            # X will in general not be a 2D feature matrix, but rather the raw training examples,
+            # e.g. text snippets or images.
+            y = check_array(
+                y,
+                accept_sparse="csr",
+                force_all_finite=True,
+                ensure_2d=False,
+                dtype=None,
+            )
+            if len(X) != y.shape[0]:
+                raise ValueError("bad input shape: len(X) != y.shape[0]")
+        else:
+            X, y = check_X_y(X, y, accept_sparse="csr")
+
+        check_classification_targets(y)
+
+        return X, y
+
+    def _fit(self, X, y, reusable=None, data_token=None):
+        """Fit underlying classifiers on validated training data, see `fit` and `refit_affected`."""
+        # Check that parameter assignment is consistent
+        self._check_parameters()
+
+        # Initialize NetworkX Graph from input class hierarchy
+        self._init_hierarchy(classes=np.unique(y))
+        self.estimators_ = {}
+
+        data_token = data_token or _data_token(X)
+
+        self.feature_extractor_ = None
+        if self.feature_extractor is not None:
+            # Extracted features are identified by the raw training data and the feature extractor
+            data_token = joblib_hash((data_token, self.feature_extractor))
+            X = self._fit_feature_extractor(X, y)
+
+        if not self._uses_raw_features():
+            # When not training on raw examples, recursively build training feature sets for each node in graph
+            with self._progress(total=self.n_classes_ + 1, desc="Building features") as progress:
+                self._recursive_build_features(X, y, node_id=self.root, progress=progress)
+
+        # Recursively train base classifiers
+        with self._progress(total=self.n_classes_ + 1, desc="Training base classifiers") as progress:
+            self._train_local_classifiers(X, y, progress=progress, data_token=data_token, reusable=reusable)
+
+        self.compile()
+
+        return self
+
+    def _check_predict_input(self, X):
+        """
+        Validate data to predict on. In raw mode, X is in general a sequence of raw examples, and is left as is,
+        unless a shared feature extractor was fitted, in which case it is transformed into features.
+
+        """
+        if self.feature_extraction == "raw":
+            if self.feature_extractor_ is None:
+                return X
+            X = self.feature_extractor_.transform(X)
+
+        return check_array(X, accept_sparse="csr")
+
+    def _fit_feature_extractor(self, X, y):
+        """Fit the shared feature extractor on all training examples, and return the features extracted from them."""
+        self.logger.debug("_fit_feature_extractor() - fitting shared feature extractor")
+        fit_transform = check_memory(self.memory).cache(_fit_transform)
+        X, self.feature_extractor_ = fit_transform(clone(self.feature_extractor), X, y)
+
+        return check_array(X, accept_sparse="csr")
+
+    def _uses_raw_features(self):
+        """Whether local classifiers are trained on raw examples, i.e in raw mode without a shared feature extractor."""
+        return self.feature_extraction == "raw" and self.feature_extractor is None
+
+    def _check_compiled(self):
+        """Compile the inference plan if it is not up to date, e.g after `partial_fit`."""
+        if getattr(self, "plan_", None) is None:
+            self.compile()
+
     def _check_parameters(self):
         """Check the parameter assignment is valid and internally consistent."""
         validate_parameters(self)
 
+    def _init_hierarchy(self, classes):
+        """Initialize the class hierarchy graph and related fitted attributes."""
+        self.class_hierarchy_ = self.class_hierarchy or make_flat_hierarchy(list(classes), root=self.root)
+        self.graph_ = DiGraph(self.class_hierarchy_)
+        self.is_tree_ = is_tree(self.graph_)
+        self.hierarchy_index_ = HierarchyIndex(self.graph_)
+        self.classes_ = list(
+            node
+            for node in self.graph_.nodes()
+            if node != self.root
+        )
+        self.fit_stats_ = NodeStats(FIT_STATS_FIELDS)
+        self.predict_stats_ = NodeStats(PREDICT_STATS_FIELDS)
+
     def _recursive_build_features(self, X, y, node_id, progress):
         """
-        Build the training feature matrix X recursively, for each node.
+        Build the training set for each node recursively.
 
         By default we use "hierarchical feature set" (terminology per Ceci and Malerba 2007)
         which builds up features at each node in the hiearchy by "rolling up" training examples
         defined on the the leaf nodes (classes) of the hierarchy into the parent classes relevant
         for classification at a particular non-leaf node.
 
+        Rather than materializing a feature matrix per node, each node only keeps the sorted indices of the rows
+        of X it should be trained on. The matrix itself is sliced out of X when training the node's classifier.
+
+        Returns
+        -------
+        indices : array-like
+            Indices of the rows of X to roll up into the parent node(s).
+
         """
-        if "X" in self.graph_.nodes[node_id]:
+        if TRAINING_ROWS in self.graph_.nodes[node_id]:
             # Already visited this node in feature building phase
-            return self.graph_.nodes[node_id]["X"]
+            if self.graph_.out_degree(node_id) == 0:
+                return self.graph_.nodes[node_id][TRAINING_ROWS]
+            return np.union1d(
+                self.graph_.nodes[node_id][TRAINING_ROWS],
+                self._labeled_rows(y, node_id),
+            )
 
         self.logger.debug("Building features for node: %s", node_id)
         progress.update(1)
 
         if self.graph_.out_degree(node_id) == 0:
             # Leaf node
-            indices = np.flatnonzero(y == node_id)
-            self.graph_.nodes[node_id]["X"] = self._build_features(
+            with measure() as stats:
+                self.graph_.nodes[node_id][TRAINING_ROWS] = np.flatnonzero(y == node_id)
+            self.fit_stats_.add(node_id, build_features_time=stats["time"])
+            return self.graph_.nodes[node_id][TRAINING_ROWS]
+
+        # Non-leaf node
+        child_rows = [
+            self._recursive_build_features(
                 X=X,
                 y=y,
-                indices=indices,
+                node_id=child_node_id,
+                progress=progress,
             )
+            for child_node_id in self.graph_.successors(node_id)
+        ]
 
-            return self.graph_.nodes[node_id]["X"]
+        with measure() as stats:
+            rows = np.unique(np.concatenate([np.empty(0, dtype=np.intp)] + child_rows))
+            self.graph_.nodes[node_id][TRAINING_ROWS] = rows
 
-        # Non-leaf node
-        if self.feature_extraction == "raw":
-            self.graph_.nodes[node_id]["X"] = []
-        else:
-            self.graph_.nodes[node_id]["X"] = csr_matrix(
-                X.shape,
-                dtype=X.dtype,
+            # Build and store metafeatures for node
+            self.graph_.nodes[node_id][METAFEATURES] = self._build_metafeatures(
+                X=X,
+                y=y,
+                indices=rows,
             )
 
-        for child_node_id in self.graph_.successors(node_id):
-            self.graph_.nodes[node_id]["X"] += \
-                self._recursive_build_features(
-                    X=X,
-                    y=y,
-                    node_id=child_node_id,
-                    progress=progress,
-                )
+            # Append training data tagged with current (intermediate) node if any, and propagate up
+            rows = np.union1d(rows, self._labeled_rows(y, node_id))
 
-        # Build and store metafeatures for node
-        self.graph_.nodes[node_id][METAFEATURES] = self._build_metafeatures(
-            X=self.graph_.nodes[node_id]["X"],
-            y=y,
-        )
+        self.fit_stats_.add(node_id, build_features_time=stats["time"])
+
+        return rows
 
-        # Append training data tagged with current (intermediate) node if any, and propagate up
+    def _labeled_rows(self, y, node_id):
+        """Return indices of the rows in y labeled with given node."""
         if not np.issubdtype(type(node_id), y.dtype):
             # If current intermediate node id type is different than that of targets array, dont bother.
             # Nb. doing this check explicitly to avoid FutureWarning, see:
             # https://stackoverflow.com/questions/40659212/futurewarning-elementwise-comparison-failed-returning-scalar-but-in-the-futur
-            return self.graph_.nodes[node_id]["X"]
+            return np.empty(0, dtype=np.intp)
 
-        indices = np.flatnonzero(y == node_id)
-        X_out = self.graph_.nodes[node_id]["X"] + self._build_features(
-            X=X,
-            y=y,
-            indices=indices,
-        )
-        return X_out
+        return np.flatnonzero(y == node_id)
 
     def _build_features(self, X, y, indices):
-        if self.feature_extraction == "raw":
+        """Slice the training data for a node out of X, given the indices of its training rows."""
+        if self._uses_raw_features():
             X_ = [X[ix] for ix in indices]
+        elif issparse(X):
+            X_, _ = extract_rows_csr(X, indices, compact=True)
         else:
-            X_ = extract_rows_csr(X, indices)
+            X_ = X[indices]
 
         # Perform feature selection
         X_ = self._select_features(X=X_, y=np.array(y)[indices])
@@ -420,7 +896,7 @@ class HierarchicalClassifier(BaseEstimator, ClassifierMixin, MetaEstimatorMixin)
         """
         return X
 
-    def _build_metafeatures(self, X, y):
+    def _build_metafeatures(self, X, y, indices):
         """
         Build the meta-features associated with a particular node.
 
@@ -431,7 +907,13 @@ class HierarchicalClassifier(BaseEstimator, ClassifierMixin, MetaEstimatorMixin)
         Parameters
         ----------
         X : (sparse) array-like, shape = [n_samples, n_features]
-            The training data matrix at current node.
+            The full training data matrix.
+
+        y : array-like, shape = [n_samples, ]
+            The full training targets.
+
+        indices : array-like
+            Indices of the rows of X used for training the classifier at current node.
 
         Returns
         -------
@@ -441,110 +923,194 @@ class HierarchicalClassifier(BaseEstimator, ClassifierMixin, MetaEstimatorMixin)
             * "n_targets" - Number of targets (classes) to classify into at given node.
 
         """
-        if self.feature_extraction == "raw":
-            # In raw mode, we do not know which training examples are "zeroed out" for which node
-            # since we do not recursively build features until the recursive training phase which comes afterwards.
-            # Therefore, the number of targets is simply the number of unique labels in y
-            return dict(
-                n_samples=len(X),
-                n_targets=len(np.unique(y)),
-            )
-
-        # Indices of non-zero rows in X, i.e rows corresponding to relevant samples for this node.
-        ix = nnz_rows_ix(X)
-
         return dict(
-            n_samples=len(ix),
-            n_targets=len(np.unique(y[ix])),
+            n_samples=len(indices),
+            n_targets=len(np.unique(y[indices])),
         )
 
-    def _recursive_train_local_classifiers(self, X, y, node_id, progress):
-        if CLASSIFIER in self.graph_.nodes[node_id]:
-            # Already trained classifier at this node, skip
-            return
+    def _train_local_classifiers(self, X, y, progress, data_token, reusable=None):
+        """
+        Train the local classifiers for all nodes in the hierarchy.
 
-        progress.update(1)
-        self._train_local_classifier(X, y, node_id)
+        The training set of each node is first determined from the targets alone (see `_local_training_set`),
+        and fingerprinted (see `_node_fingerprint`). Training data for a node is then only materialized if its
+        local classifier cannot be reused (nor loaded from the cache, see the `memory` parameter), one node at a time,
+        while fitting the local classifiers
+        is dispatched to joblib, optionally running in parallel (see the `n_jobs` parameter).
+        When running in parallel, nodes with the most training samples are scheduled first, so that the
+        largest (and typically slowest) classifiers do not end up being trained last.
 
-        for child_node_id in self.graph_.successors(node_id):
-            self._recursive_train_local_classifiers(
-                X=X,
-                y=y,
-                node_id=child_node_id,
-                progress=progress,
+        Parameters
+        ----------
+        data_token : str
+            Token identifying the training data, see `_data_token`.
+
+        reusable : dict or None
+            Already fitted local classifiers that may be kept, as a mapping of node ids to
+            (fingerprint, classifier) tuples. A classifier is kept if its fingerprint matches
+            the fingerprint of the node's current training set.
+
+        """
+        reusable = reusable or {}
+        fit = check_memory(self.memory).cache(_fit_estimator, ignore=["X", "y"])
+        # Peak memory is tracked process-wide, and can only be attributed to a node when training serially
+        trace_memory = effective_n_jobs(self.n_jobs) == 1
+
+        node_ids = [
+            node_id
+            for node_id in dfs_preorder_nodes(self.graph_, source=self.root)
+            if CLASSIFIER not in self.graph_.nodes[node_id]
+        ]
+        if effective_n_jobs(self.n_jobs) != 1:
+            node_ids.sort(
+                key=lambda node_id: self.graph_.nodes[node_id].get(METAFEATURES, {}).get("n_samples", 0),
+                reverse=True,
             )
 
-    def _train_local_classifier(self, X, y, node_id):
+        def _tasks():
+            for node_id in node_ids:
+                progress.update(1)
+                with measure() as stats:
+                    training_set = self._local_training_set(y, node_id)
+                self.fit_stats_.add(node_id, build_features_time=stats["time"])
+
+                if not self.keep_training_data:
+                    # Training rows of node are held by its training set, no need to keep them on the graph
+                    self.graph_.nodes[node_id].pop(TRAINING_ROWS, None)
+
+                if training_set is None:
+                    continue
+
+                clf, rows, local_rows, y_ = training_set
+                fingerprint = self._node_fingerprint(data_token, *training_set)
+                self.graph_.nodes[node_id][FINGERPRINT] = fingerprint
+
+                fingerprint_, fitted_clf = reusable.get(node_id, (None, None))
+                if fingerprint_ != fingerprint and self.memory is not None:
+                    # The training data is not part of the cache key, and need not be materialized on a cache hit
+                    if fit.check_call_in_cache(clf, None, None, fingerprint=fingerprint):
+                        fitted_clf = fit(clf, None, None, fingerprint=fingerprint)
+                        fingerprint_ = fingerprint
+
+                if fingerprint_ == fingerprint:
+                    self.logger.debug("_train_local_classifiers() - reusing local classifier for node %s", node_id)
+                    self.graph_.nodes[node_id][CLASSIFIER] = fitted_clf
+                    self.estimators_[node_id] = fitted_clf
+                    continue
+
+                with measure() as stats:
+                    X_ = self._build_local_training_data(X, y, rows, local_rows)
+                self.fit_stats_.add(node_id, build_features_time=stats["time"])
+                self.fit_stats_.set(node_id, **data_stats(X_, y_))
+
+                yield delayed(_fit_local_classifier)(
+                    node_id,
+                    clf,
+                    X_,
+                    y_,
+                    fit=fit,
+                    fingerprint=fingerprint,
+                    callbacks=self.callbacks,
+                    trace_memory=trace_memory,
+                )
+
+        for node_id, clf, stats in Parallel(n_jobs=self.n_jobs)(_tasks()):
+            self.fit_stats_.set(node_id, train_time=stats["time"], peak_memory=stats["peak_memory"])
+            self.graph_.nodes[node_id][CLASSIFIER] = clf
+            self.estimators_[node_id] = clf
+
+    def _node_fingerprint(self, data_token, clf, rows, local_rows, y_):
+        """
+        Compute a fingerprint of the training set of a local classifier, as returned by `_local_training_set`.
+
+        The fingerprint covers the training data (through its token), the rows of it the local classifier is
+        trained on, their targets rolled up into the node's children and the unfitted local classifier `clf`,
+        which together determine the fitted local classifier. It is computed without materializing
+        the training data.
+
+        """
+        return joblib_hash((data_token, rows, local_rows, y_, clf))
+
+    def _local_training_set(self, y, node_id):
+        """
+        Determine the training set of the local classifier for given node, without materializing its training data.
+
+        Returns
+        -------
+        clf, rows, local_rows, y_
+            The (unfitted) local classifier, and its training set: the training data is given by the `rows` of X
+            (or all of X when None), from which `local_rows` are then taken (possibly repeated, or all of them
+            when None), and `y_` are the corresponding targets (see `_build_local_training_data`).
+            None if no classifier should be trained at given node.
+
+        """
         if self.graph_.out_degree(node_id) == 0:
             # Leaf node
             if self.algorithm == "lcpn":
                 # Leaf nodes do not get a classifier assigned in LCPN algorithm mode.
                 self.logger.debug(
-                    "_train_local_classifier() - skipping leaf node %s when algorithm is 'lcpn'",
+                    "_local_training_set() - skipping leaf node %s when algorithm is 'lcpn'",
                     node_id,
                 )
-                return
+                return None
 
-        if self.feature_extraction == "raw":
-            X_ = X
-            nnz_rows = range(len(X))
-            Xl = len(X_)
+        raw = self._uses_raw_features()
+        if raw:
+            rows = None
+            targets = y
         else:
-            X = self.graph_.nodes[node_id]["X"]
-            nnz_rows = nnz_rows_ix(X)
-            X_ = X[nnz_rows, :]
-            Xl = X_.shape
+            rows = self.graph_.nodes[node_id][TRAINING_ROWS]
+            targets = y[rows]
 
         y_rolled_up = rollup_nodes(
             graph=self.graph_,
             source=node_id,
-            targets=[y[idx] for idx in nnz_rows],
-            mlb=self.mlb
+            targets=targets,
+            mlb=self.mlb,
+            index=self.hierarchy_index_,
         )
 
-        if self.is_tree_:
-            if self.mlb is None:
-                y_ = flatten_list(y_rolled_up)
-            else:
-                y_ = self.mlb.transform(y_rolled_up)
-                # take all non zero, only compare in side the siblings
-                idx = np.where(y_.sum(1) > 0)[0]
-                y_ = y_[idx, :]
-                if self.feature_extraction == "raw":
-                    X_ = [X_[tk] for tk in idx]
-                else:
-                    X_ = X_[idx, :]
+        if self.is_tree_ and self.mlb is not None:
+            y_ = self.mlb.transform(y_rolled_up)
+            # take all non zero, only compare in side the siblings
+            local_rows = np.where(y_.sum(1) > 0)[0]
+            y_ = y_[local_rows, :]
+        elif self.is_tree_ and not raw:
+            local_rows = None
+            y_ = flatten_list(y_rolled_up)
         else:
-            # Class hierarchy graph is a DAG
-            if self.feature_extraction == "raw":
-                X_, y_ = apply_rollup_Xy_raw(X_, y_rolled_up)
-            else:
-                X_, y_ = apply_rollup_Xy(X_, y_rolled_up)
+            # Class hierarchy graph is a DAG, or raw examples which are not restricted to the training rows
+            # of the node, so that some of them may not roll up into any child node:
+            # repeat each row once per label it is rolled up into
+            local_rows = rollup_rows(y_rolled_up)
+            if len(local_rows) == len(y_rolled_up) and np.all(local_rows == np.arange(len(local_rows))):
+                # No expansion needed
+                local_rows = None
+            y_ = flatten_list(y_rolled_up)
 
         num_targets = len(np.unique(y_))
 
         self.logger.debug(
-            "_train_local_classifier() - Training local classifier for node: %s, X_.shape: %s, len(y): %s, n_targets: %s",  # noqa:E501
+            "_local_training_set() - Training set for node: %s, n_samples: %s, n_targets: %s",
             node_id,
-            Xl,
             len(y_),
             num_targets,
         )
 
-        if self.feature_extraction == "preprocessed" and X_.shape[0] == 0:
+        if len(y_) == 0:
             # No training data could be materialized for current node
             # TODO: support a "strict" mode flag to explicitly enable/disable fallback logic here?
             self.logger.warning(
-                "_train_local_classifier() - not enough training data available to train, classification in branch will terminate at node %s",  # noqa:E501
+                "_local_training_set() - not enough training data available to train, classification in branch will terminate at node %s",  # noqa:E501
                 node_id,
             )
-            return
+            return None
         elif num_targets == 1:
             # Training data could be materialized for only a single target at current node
             # TODO: support a "strict" mode flag to explicitly enable/disable fallback logic here?
             constant = y_[0]
             self.logger.debug(
-                "_train_local_classifier() - only a single target (child node) available to train classifier for node %s, Will trivially predict %s",  # noqa:E501
+                "_local_training_set() - only a single target (child node) available to train classifier for node %s, Will trivially predict %s",  # noqa:E501
                 node_id,
                 constant,
             )
@@ -553,108 +1119,368 @@ class HierarchicalClassifier(BaseEstimator, ClassifierMixin, MetaEstimatorMixin)
         else:
             clf = self._base_estimator_for(node_id)
 
-        if self.feature_extraction == "raw":
-            if len(X_) > 0:
-                clf.fit(X=X_, y=y_)
+        return clf, rows, local_rows, y_
+
+    def _build_local_training_data(self, X, y, rows, local_rows):
+        """Materialize the training data of a local classifier, given its training set (see `_local_training_set`)."""
+        X_ = X if rows is None else self._build_features(X=X, y=y, indices=rows)
+        if local_rows is None:
+            return X_
+
+        if isinstance(X_, csr_matrix):
+            return gather_rows_csr(X_, local_rows)
+
+        return take_rows(X_, local_rows)
+
+    def _partial_fit_local_classifier(self, X, y, y_ix, node_id):
+        """Update the local classifier of given node with the samples in a batch that are relevant to it."""
+        index = self.hierarchy_index_
+        node_ix = index.node_ix[node_id]
+        children = list(self.graph_.successors(node_id))
+        if not children:
+            # Leaf node
+            return
+
+        clf = self.graph_.nodes[node_id].get(CLASSIFIER, None)
+        if len(children) == 1 and clf is not None:
+            # Constant classifier for a node with a single child, nothing to learn
+            return
+
+        # Samples with a target strictly below current node, looked up in the sparse reachability row of the node
+        reachability = index.reachability
+        below = reachability.indices[reachability.indptr[node_ix]:reachability.indptr[node_ix + 1]]
+        rows = np.flatnonzero((y_ix != node_ix) & np.isin(y_ix, below))
+        if not len(rows):
+            return
+
+        y_rolled_up = index.rollup(source=node_id, targets=y[rows])
+        X_, y_ = apply_rollup_Xy(X[rows], y_rolled_up)
+
+        if len(children) == 1:
+            clf = DummyClassifier(strategy="constant", constant=children[0]).fit(X_, y_)
+        else:
+            if (
+                clf is None
+                or isinstance(clf, DummyClassifier)
+                or set(np.asarray(clf.classes_).tolist()) != set(children)
+            ):
+                # No classifier yet, or a classifier (e.g fitted by `fit`) which was not trained on all children
+                # of the node, and cannot learn about the other ones incrementally: start over from a fresh one
                 self.logger.debug(
-                    "_train_local_classifier() - training node %s ",  # noqa:E501
+                    "_partial_fit_local_classifier() - training new local classifier for node %s",
                     node_id,
                 )
-                self.graph_.nodes[node_id][CLASSIFIER] = clf
-            else:
-                self.logger.debug(
-                    "_train_local_classifier() - could not train  node %s ",  # noqa:E501
-                    node_id,
+                clf = self._base_estimator_for(node_id)
+            if not hasattr(clf, "partial_fit"):
+                raise ValueError(
+                    "Base estimator for node {} ({}) does not support partial_fit().".format(
+                        node_id,
+                        type(clf).__name__,
+                    )
                 )
-
-        else:
-            clf.fit(X=X_, y=y_)
-            self.graph_.nodes[node_id][CLASSIFIER] = clf
+            shapes = dict(X_shape=data_shape(X_), y_shape=np.shape(y_))
+            run_callbacks(self.callbacks, "on_node_fit_start", node_id=node_id, **shapes)
+            with measure() as stats:
+                clf.partial_fit(X_, y_, classes=children)
+            run_callbacks(self.callbacks, "on_node_fit_end", node_id=node_id, elapsed=stats["time"], **shapes)
+            self.fit_stats_.add(node_id, train_time=stats["time"])
+
+        self.graph_.nodes[node_id][CLASSIFIER] = clf
         self.estimators_[node_id] = clf
 
-    def _recursive_predict(self, x, root):  # noqa:C901 TODO: refactor
-        if CLASSIFIER not in self.graph_.nodes[root]:
-            return None, None
-
-        clf = self.graph_.nodes[root][CLASSIFIER]
-        path = [root]
-        path_proba = []
-        class_proba = np.zeros_like(self.classes_, dtype=np.float64)
-
-        while clf:
-            if self.use_decision_function and hasattr(clf, "decision_function"):
-                if self.feature_extraction == "raw":
-                    probs = clf.decision_function([x])
-                    argmax = np.argmax(probs)
-                    score = probs[0, argmax]
-
-                else:
-                    probs = clf.decision_function(x)
-                    argmax = np.argmax(probs)
-                    score = probs[argmax]
-            else:
-                probs = clf.predict_proba(x)[0]
-                argmax = np.argmax(probs)
-                score = probs[argmax]
-
-            path_proba.append(score)
-            if self.mlb is not None:
-                predictions = []
-
-            # Report probabilities in terms of complete class hierarchy
-            if len(clf.classes_) == 1:
-                prediction = clf.classes_[0]
-
-            for local_class_idx, class_ in enumerate(clf.classes_):
-                if self.mlb:
-                    # when we have a multi-label binarizer
-                    class_idx = class_
-                    class_proba[class_idx] = probs[0, local_class_idx]
-                    if class_proba[class_idx] > self.mlb_prediction_threshold:
-                        predictions.append(self.mlb.classes_[class_])
-                else:
-                    try:
-                        class_idx = self.classes_.index(class_)
-                    except ValueError:
-                        # This may happen if the classes_ enumeration we construct during fit()
-                        # has a mismatch with the individual node classifiers" classes_.
-                        self.logger.error(
-                            "Could not find index in self.classes_ for class_ = '%s' (type: %s). path: %s",
-                            class_,
-                            type(class_),
-                            path,
-                        )
-                        raise
-                    if len(probs.shape) > 1 and probs.shape[0] == 1:
-                        class_proba[class_idx] = probs[0, local_class_idx]
-                        if local_class_idx == argmax:
-                            prediction = class_
-                    else:
-                        class_proba[class_idx] = probs[local_class_idx]
-                        if local_class_idx == argmax:
-                            prediction = class_
-
-            if self.mlb is None:
-                if self._should_early_terminate(
-                    current_node=path[-1],
-                    prediction=prediction,
-                    score=score,
-                ):
-                    break
-
-                # Update current path
-                path.append(prediction)
-                clf = self.graph_.nodes[prediction].get(CLASSIFIER, None)
-            else:
-                clf = None
-                for prediction in predictions:
-                    pred_path, preds_prob = self._recursive_predict(x, prediction)
-                    path.append(prediction)
-                    if preds_prob is not None:
-                        class_proba += preds_prob
-                        path.extend(pred_path)
-
-        return path, class_proba
+    def _batch_predict(self, X, with_proba=False):
+        """
+        Predict targets for all samples in X at once, using a level-synchronous traversal of the hierarchy.
+
+        At each level, samples are grouped by the node they have currently reached, and the classifier
+        at that node is invoked once for the whole group. The groups are then partitioned by predicted
+        child node and passed down to the next level, until every sample has reached a node with no classifier
+        or was stopped early (see `_should_early_terminate`).
+
+        Returns
+        -------
+        y_pred : array-like, shape = [n_samples, ]
+            Predicted targets.
+
+        class_proba : array-like, shape = [n_samples, n_classes] or None
+            When `with_proba` is set, the scores reported by each classifier along the prediction path of
+            every sample, with columns following `classes_`.
+
+        """
+        y_pred, class_proba = zip(*(
+            self._route(n_samples=n_samples, local_scores=local_scores, with_proba=with_proba)
+            for n_samples, local_scores in self._score_batches(X)
+        ))
+
+        return (
+            np.concatenate(y_pred),
+            np.concatenate(class_proba) if with_proba else None,
+        )
+
+    def _batch_predict_multilabel(self, X):
+        """
+        Predict multi-label targets for all samples in X at once.
+
+        Starting from the root, every sample is passed down to each of the nodes its scores at the current node
+        exceed `mlb_prediction_threshold` for, and the classifier at a node is invoked once for all the samples
+        reaching it through a given path.
+
+        Returns
+        -------
+        paths : array-like, shape = [n_samples, ]
+            For each sample, the list of nodes visited, in depth-first order.
+
+        class_proba : array-like, shape = [n_samples, n_classes]
+            For each sample, the scores reported by the classifiers at the visited nodes, summed up.
+
+        """
+        plan = self.plan_
+
+        def _visit(local_scores, node, rows):
+            slot = plan.classifier_slot[node]
+            if slot < 0:
+                return None, None
+
+            scores = local_scores(slot, rows)
+            class_proba = np.zeros((len(rows), self.n_classes_), dtype=np.float64)
+            class_proba[:, plan.slot_columns(slot)] = scores
+            paths = [[plan.nodes[node]] for _ in rows]
+
+            for local_class, target in enumerate(plan.slot_targets(slot)):
+                ix = np.flatnonzero(scores[:, local_class] > self.mlb_prediction_threshold)
+                if not len(ix):
+                    continue
+
+                target_proba, target_paths = _visit(local_scores, target, rows[ix])
+                for i in ix:
+                    paths[i].append(plan.nodes[target])
+                if target_proba is not None:
+                    class_proba[ix] += target_proba
+                    for i, target_path in zip(ix, target_paths):
+                        paths[i].extend(target_path)
+
+            return class_proba, paths
+
+        paths, class_proba = [], []
+        for n_samples, local_scores in self._score_batches(X):
+            batch_proba, batch_paths = _visit(local_scores, plan.root, np.arange(n_samples))
+            if batch_proba is None:
+                # No classifier at the root node
+                batch_proba = np.zeros((n_samples, self.n_classes_), dtype=np.float64)
+                batch_paths = [[plan.nodes[plan.root]] for _ in range(n_samples)]
+            paths.extend(batch_paths)
+            class_proba.append(batch_proba)
+
+        y_pred = np.empty(len(paths), dtype=object)
+        y_pred[:] = paths
+        return y_pred, np.concatenate(class_proba)
+
+    def _score_batches(self, X):
+        """
+        Split samples into batches for scoring by the local classifiers.
+
+        Yields
+        ------
+        n_samples, local_scores
+            The number of samples in the batch, and a function computing the scores of the local classifier
+            in given slot for given sample indices within the batch (see `_local_scores`).
+
+        """
+        plan = self.plan_
+        if plan.fused is None:
+            yield _num_samples(X), lambda slot, rows: self._slot_scores(slot, take_rows(X, rows))
+            return
+
+        # Scores of all local classifiers are computed at once, a batch of samples at a time
+        for start in range(0, max(X.shape[0], 1), FUSED_BATCH_SIZE):
+            scores = plan.fused.scores(X[start:start + FUSED_BATCH_SIZE])
+            yield scores.shape[0], partial(_slice_scores, scores, plan.local_indptr)
+
+    def _route(self, n_samples, local_scores, with_proba=False):
+        """
+        Route samples through the compiled inference plan, level by level.
+
+        Parameters
+        ----------
+        n_samples : int
+            Number of samples to route.
+
+        local_scores : callable
+            Function computing the scores of the local classifier in given slot for given sample indices.
+
+        with_proba : bool
+            Whether to also return the scores reported along the prediction path of every sample.
+
+        """
+        plan = self.plan_
+        class_proba = np.zeros((n_samples, self.n_classes_), dtype=np.float64) if with_proba else None
+
+        # Integer id of the node each sample has currently reached, and the samples still being routed
+        current = np.full(n_samples, plan.root, dtype=np.intp)
+        active = np.arange(n_samples)
+
+        while len(active):
+            slots = plan.classifier_slot[current[active]]
+            # Samples terminate at nodes without a classifier
+            active, slots = active[slots >= 0], slots[slots >= 0]
+
+            next_active = []
+            for slot, ix in group_by(slots):
+                rows = active[ix]
+                probs = local_scores(slot, rows)
+                if with_proba:
+                    class_proba[np.ix_(rows, plan.slot_columns(slot))] = probs
+
+                argmax = np.argmax(probs, axis=1)
+                targets = plan.slot_targets(slot)[argmax]
+                stop = self._should_early_terminate_rows(
+                    current_node=plan.nodes[plan.slot_nodes[slot]],
+                    predictions=plan.nodes[targets],
+                    scores=probs[np.arange(len(rows)), argmax],
+                )
+
+                current[rows[~stop]] = targets[~stop]
+                next_active.append(rows[~stop])
+
+            active = np.concatenate(next_active) if next_active else active[:0]
+
+        return np.array(list(plan.nodes[current])), class_proba
+
+    def _marginal_proba(self, n_samples, local_scores):
+        """
+        Compute the marginal probability of every class for a batch of samples, see the `proba_mode` parameter.
+
+        Nodes are visited in topological order, so that the marginal probability of a node is complete by the
+        time it is split among its children, with one call of the local classifier per node.
+
+        """
+        plan = self.plan_
+        marginals = np.zeros((n_samples, plan.n_nodes), dtype=np.float64)
+        marginals[:, plan.root] = 1.
+
+        for node in plan.order:
+            slot = plan.classifier_slot[node]
+            if slot < 0:
+                continue
+
+            rows = np.flatnonzero(marginals[:, node] > 0)
+            if not len(rows):
+                continue
+
+            probs = local_scores(slot, rows)
+            marginals[np.ix_(rows, plan.slot_targets(slot))] += marginals[rows, node][:, np.newaxis] * probs
+
+        is_class = plan.node_columns >= 0
+        class_proba = np.zeros((n_samples, self.n_classes_), dtype=np.float64)
+        class_proba[:, plan.node_columns[is_class]] = marginals[:, is_class]
+        return class_proba
+
+    def _beam_search(self, n_samples, local_scores, k, beam_width):
+        """
+        Find the k best paths for a batch of samples, see `predict_topk`.
+
+        All beams of all samples are kept in flat arrays, and beams having reached the same node are scored
+        together with a single call of its local classifier.
+
+        """
+        plan = self.plan_
+        beam_rows = np.arange(n_samples)
+        beam_nodes = np.full(n_samples, plan.root, dtype=np.intp)
+        beam_scores = np.zeros(n_samples, dtype=np.float64)
+
+        while True:
+            slots = plan.classifier_slot[beam_nodes]
+            pending = np.flatnonzero(slots >= 0)
+            if not len(pending):
+                break
+
+            # Beams which have terminated are carried over as is
+            done = np.flatnonzero(slots < 0)
+            rows, nodes, scores = [beam_rows[done]], [beam_nodes[done]], [beam_scores[done]]
+
+            for slot, ix in group_by(slots[pending]):
+                beams = pending[ix]
+                with np.errstate(divide="ignore"):
+                    log_probs = np.log(local_scores(slot, beam_rows[beams]))
+
+                targets = plan.slot_targets(slot)
+                rows.append(np.repeat(beam_rows[beams], len(targets)))
+                nodes.append(np.tile(targets, len(beams)))
+                scores.append((beam_scores[beams][:, np.newaxis] + log_probs).ravel())
+
+            beam_rows, beam_nodes, beam_scores = np.concatenate(rows), np.concatenate(nodes), np.concatenate(scores)
+
+            # Paths merging into the same node (in a DAG) are deduplicated, and only the best beams are kept
+            keep = rank_by_group(beam_rows * plan.n_nodes + beam_nodes, beam_scores) == 0
+            beam_rows, beam_nodes, beam_scores = beam_rows[keep], beam_nodes[keep], beam_scores[keep]
+            keep = rank_by_group(beam_rows, beam_scores) < beam_width
+            beam_rows, beam_nodes, beam_scores = beam_rows[keep], beam_nodes[keep], beam_scores[keep]
+
+        y_topk = np.full((n_samples, k), None, dtype=object)
+        scores = np.full((n_samples, k), -np.inf, dtype=np.float64)
+
+        ranks = rank_by_group(beam_rows, beam_scores)
+        top = ranks < k
+        y_topk[beam_rows[top], ranks[top]] = plan.nodes[beam_nodes[top]]
+        scores[beam_rows[top], ranks[top]] = beam_scores[top]
+
+        return y_topk, scores
+
+    def _slot_scores(self, slot, X):
+        """
+        Compute the scores of the local classifier in given slot, recording prediction statistics for its node
+        if `record_predict_stats` is set.
+
+        """
+        node_id = self.plan_.nodes[self.plan_.slot_nodes[slot]]
+        with measure(trace_memory=False) as stats:
+            scores = self._local_scores(self.plan_.classifiers[slot], X)
+
+        if self.record_predict_stats:
+            self.predict_stats_.add(node_id, n_calls=1, n_samples=scores.shape[0], predict_time=stats["time"])
+        run_callbacks(self.callbacks, "on_node_predict", node_id=node_id, X_shape=data_shape(X), elapsed=stats["time"])
+
+        return scores
+
+    def _local_scores(self, clf, X):
+        """
+        Compute the scores of a local classifier for a batch of samples.
+
+        Returns a matrix of shape [n_samples, n_local_classes], with columns following the order of `clf.classes_`.
+
+        """
+        if self.use_decision_function and hasattr(clf, "decision_function"):
+            scores = clf.decision_function(X)
+            if scores.ndim == 1:
+                # Binary classifiers report a single score for the positive class
+                scores = np.column_stack((-scores, scores))
+            return scores
+
+        return clf.predict_proba(X)
+
+    def _should_early_terminate_rows(self, current_node, predictions, scores):
+        """
+        Evaluate early-termination for a batch of samples at given node.
+
+        Returns a boolean mask over the batch, see `_should_early_terminate`.
+
+        """
+        if self.prediction_depth != "nmlnp":
+            return np.zeros(len(scores), dtype=bool)
+
+        if isinstance(self.stopping_criteria, float):
+            if current_node == self.root:
+                return np.zeros(len(scores), dtype=bool)
+            return scores < self.stopping_criteria
+
+        return np.array([
+            self._should_early_terminate(
+                current_node=current_node,
+                prediction=prediction,
+                score=score,
+            )
+            for prediction, score in zip(predictions, scores)
+        ], dtype=bool)
 
     def _should_early_terminate(self, current_node, prediction, score):
         """
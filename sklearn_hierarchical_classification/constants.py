@@ -10,11 +10,14 @@ ROOT = "<ROOT>"
 # Dictionary keys used in various places by classifier
 CLASSIFIER = "classifier"
 DEFAULT = "default"
+FINGERPRINT = "fingerprint"
 METAFEATURES = "metafeatures"
+TRAINING_ROWS = "training_rows"
 
 # Enumeration of valid configuration types
 VALID_ALGORITHM = ("lcn", "lcpn")
 VALID_FEATURE_EXTRACTION = ("preprocessed", "raw")
 VALID_PREDICTION_DEPTH = ("mlnp", "nmlnp")
+VALID_PROBA_MODE = ("path", "marginal")
 VALID_TRAINING_STRATEGY = ("exclusive", "less_exclusive", "inclusive", "less_inclusive",
                            "siblings", "exclusive_siblings")
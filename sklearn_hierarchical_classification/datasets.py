@@ -0,0 +1,209 @@
+"""
+Synthetic class hierarchies and datasets, e.g for load testing and benchmarking.
+
+"""
+import numpy as np
+from networkx import DiGraph
+from scipy.sparse import csr_matrix, vstack
+from sklearn.utils import check_random_state
+
+from sklearn_hierarchical_classification.constants import ROOT
+from sklearn_hierarchical_classification.graph import HierarchyIndex, terminal_nodes
+
+
+def make_hierarchy(depth, branching, skew=0., multi_parent_rate=0., root=ROOT, random_state=None):
+    """
+    Create a synthetic class hierarchy.
+
+    Nodes (other than the root) are integers numbered level by level, starting from 0, so that they can also be
+    used as column indices of binarized targets (see `sklearn_hierarchical_classification.metrics`).
+    E.g with depth=4 and branching=10, the hierarchy has 11,111 nodes (including the root).
+
+    Parameters
+    ----------
+    depth : int
+        Number of levels below the root node.
+
+    branching : int
+        Average number of children of the nodes above the last level.
+
+    skew : float
+        When zero (the default), every node above the last level has exactly `branching` children, giving a
+        balanced tree. Otherwise, the children of each level are allocated to the nodes of the level above with
+        probabilities following a Zipf law of exponent `skew`, giving a skewed tree in which some nodes have many
+        children while others have none (and become leaves above the last level).
+
+    multi_parent_rate : float
+        Fraction of the nodes below the first level which are assigned an extra parent, picked at random
+        among the other nodes of the level above. Any value greater than zero turns the hierarchy into a DAG.
+
+    root : integer, string
+        The identifier of the root node.
+
+    random_state : int, RandomState instance or None
+
+    Returns
+    -------
+    graph : networkx.DiGraph
+
+    """
+    rng = check_random_state(random_state)
+
+    graph = DiGraph()
+    graph.add_node(root)
+    parents = [root]
+    n_nodes = 0
+
+    for level in range(depth):
+        n_parents = len(parents)
+        n_children = n_parents * branching
+        if skew:
+            weights = 1. / np.arange(1, n_parents + 1) ** skew
+            counts = rng.multinomial(n_children, rng.permutation(weights / weights.sum()))
+        else:
+            counts = np.full(n_parents, branching)
+
+        children = list(range(n_nodes, n_nodes + n_children))
+        parent_ix = np.repeat(np.arange(n_parents), counts)
+        graph.add_edges_from((parents[ix], child) for ix, child in zip(parent_ix.tolist(), children))
+
+        if level > 0 and multi_parent_rate and n_parents > 1:
+            extra = np.flatnonzero(rng.uniform(size=n_children) < multi_parent_rate)
+            # Draw among all parents but the original one, by skipping over its index
+            extra_parent_ix = rng.randint(n_parents - 1, size=len(extra))
+            extra_parent_ix += extra_parent_ix >= parent_ix[extra]
+            graph.add_edges_from(
+                (parents[ix], children[child_ix])
+                for ix, child_ix in zip(extra_parent_ix.tolist(), extra.tolist())
+            )
+
+        parents = children
+        n_nodes += n_children
+
+    return graph
+
+
+def iter_hierarchical_dataset(
+    graph,
+    n_samples,
+    chunk_size=10000,
+    n_features=10000,
+    n_node_features=20,
+    n_tokens=50,
+    noise=0.1,
+    label_skew=0.,
+    root=ROOT,
+    random_state=None,
+):
+    """
+    Generate a sparse dataset from a hierarchical mixture, in chunks of samples.
+
+    Samples are labeled with the leaves of the class hierarchy, and their features are drawn from a
+    "bag of words" mixture following the hierarchy: every node is associated with a small random set of features
+    (its "topic"), and each of the `n_tokens` tokens of a sample is drawn from the topic of one of the nodes on the
+    path(s) from the root to its leaf, picked uniformly, or as random noise with probability `noise`. The local
+    classifiers at every level of the hierarchy thus have signal to learn from.
+
+    Chunks are generated one at a time, so that datasets do not need to fit in memory.
+    Given a random state, the generated data is reproducible for a given `chunk_size`.
+
+    Parameters
+    ----------
+    graph : networkx.DiGraph
+        The class hierarchy, e.g as created by `make_hierarchy`.
+
+    n_samples : int
+        Total number of samples to generate.
+
+    chunk_size : int
+        Number of samples in each chunk.
+
+    n_features : int
+        Number of features.
+
+    n_node_features : int
+        Number of features in the topic of each node.
+
+    n_tokens : int
+        Number of tokens drawn for each sample. Tokens drawn more than once for a sample add up.
+
+    noise : float
+        Probability of drawing each token uniformly at random among all features.
+
+    label_skew : float
+        When zero (the default), labels are distributed uniformly over the leaves. Otherwise, they follow a Zipf law
+        of exponent `label_skew` over the leaves (taken in random order), giving long-tailed class frequencies.
+
+    root : integer, string
+        The identifier of the root node.
+
+    random_state : int, RandomState instance or None
+
+    Yields
+    ------
+    X : csr_matrix, shape = [chunk_size, n_features]
+        Token counts of each sample (the last chunk may be smaller).
+
+    y : array, shape = [chunk_size]
+        The leaf each sample is labeled with.
+
+    """
+    rng = check_random_state(random_state)
+    index = HierarchyIndex(graph)
+
+    leaves = np.array([node for node in terminal_nodes(graph) if node != root])
+    leaves_ix = index.node_indices(leaves)
+    if label_skew:
+        prior = 1. / np.arange(1, len(leaves) + 1) ** label_skew
+        prior = rng.permutation(prior / prior.sum())
+    else:
+        prior = None
+
+    topics = rng.randint(n_features, size=(index.n_nodes, n_node_features))
+
+    # Nodes on the path(s) from the root to each leaf, the root itself excluded
+    not_root = np.ones(index.n_nodes, dtype=bool)
+    not_root[index.node_ix[root]] = False
+    paths = csr_matrix(index.reachability[:, leaves_ix].T.multiply(not_root))
+    paths.eliminate_zeros()
+    path_lengths = np.diff(paths.indptr)
+
+    for start in range(0, n_samples, chunk_size):
+        size = min(chunk_size, n_samples - start)
+        labels = rng.choice(len(leaves), size=size, p=prior)
+
+        rows = np.repeat(np.arange(size), n_tokens)
+        token_labels = labels[rows]
+        offsets = (rng.uniform(size=len(rows)) * path_lengths[token_labels]).astype(np.intp)
+        nodes = paths.indices[paths.indptr[token_labels] + offsets]
+        features = topics[nodes, rng.randint(n_node_features, size=len(rows))]
+
+        is_noise = rng.uniform(size=len(rows)) < noise
+        features[is_noise] = rng.randint(n_features, size=is_noise.sum())
+
+        X = csr_matrix(
+            (np.ones(len(rows)), (rows, features)),
+            shape=(size, n_features),
+        )
+        yield X, leaves[labels]
+
+
+def make_hierarchical_dataset(graph, n_samples, **kwargs):
+    """
+    Generate a sparse dataset from a hierarchical mixture, see `iter_hierarchical_dataset`.
+
+    Returns
+    -------
+    X : csr_matrix, shape = [n_samples, n_features]
+
+    y : array, shape = [n_samples]
+
+    """
+    chunks = list(iter_hierarchical_dataset(graph, n_samples, **kwargs))
+    if not chunks:
+        raise ValueError("n_samples must be greater than zero.")
+
+    return (
+        vstack([X for X, _ in chunks], format="csr"),
+        np.concatenate([y for _, y in chunks]),
+    )
@@ -4,8 +4,11 @@ Graph processing helpers.
 """
 from collections import defaultdict
 
-from networkx import all_simple_paths
-from numpy import ndarray
+import numpy as np
+from networkx import topological_sort
+from scipy.sparse import csr_matrix
+
+from sklearn_hierarchical_classification.array import flatten_list
 
 
 def make_flat_hierarchy(targets, root):
@@ -16,35 +19,133 @@ def make_flat_hierarchy(targets, root):
     return adjacency
 
 
-def rollup_nodes(graph, source, targets, mlb=None):
+class HierarchyIndex(object):
+    """
+    Precomputed reachability index over a class hierarchy graph.
+
+    Nodes are assigned integer ids (their position in `nodes`), and the transitive closure of the graph
+    is stored as a sparse boolean matrix, so that questions such as "which children of a given node lead to
+    a given descendant" can be answered for many targets at once without enumerating paths in the graph.
+
+    Parameters
+    ----------
+    graph : the class hierarchy graph, given as a `networkx.DiGraph` instance. Must be a tree/DAG (no cycles).
+
+    Attributes
+    ----------
+    nodes : list
+        The graph nodes, indexed by their integer id.
+
+    node_ix : dict
+        Mapping of graph nodes to their integer id.
+
+    children : list of arrays
+        For each node id, the ids of its immediate children.
+
+    reachability : (sparse) csr_matrix, shape = [n_nodes, n_nodes]
+        Boolean matrix, where entry (i, j) is set when node j is reachable from node i (including i itself).
+
+    """
+
+    def __init__(self, graph):
+        self.nodes = list(graph.nodes())
+        self.node_ix = {
+            node: ix
+            for ix, node in enumerate(self.nodes)
+        }
+        self.children = [
+            np.array([self.node_ix[child] for child in graph.successors(node)], dtype=np.intp)
+            for node in self.nodes
+        ]
+        self.reachability = self._build_reachability(graph)
+
+    @property
+    def n_nodes(self):
+        return len(self.nodes)
+
+    def _build_reachability(self, graph):
+        reachable = [None] * self.n_nodes
+        for node in reversed(list(topological_sort(graph))):
+            ix = self.node_ix[node]
+            reachable[ix] = np.unique(np.concatenate(
+                [[ix]] + [reachable[child_ix] for child_ix in self.children[ix]]
+            )).astype(np.intp)
+
+        indptr = np.concatenate(([0], np.cumsum([len(ixs) for ixs in reachable])))
+        indices = np.concatenate(reachable) if reachable else np.empty(0, dtype=np.intp)
+        return csr_matrix(
+            (np.ones(len(indices), dtype=bool), indices, indptr),
+            shape=(self.n_nodes, self.n_nodes),
+        )
+
+    def node_indices(self, nodes):
+        """Return the integer ids of given nodes, or -1 for nodes not in graph."""
+        return np.array([self.node_ix.get(node, -1) for node in nodes], dtype=np.intp)
+
+    def rollup(self, source, targets, mlb=None):
+        """
+        Perform a "roll-up" of given target nodes up to the nodes immediately below given source node.
+
+        Parameters
+        ----------
+        source : the graph node to roll up to
+
+        targets : array-like, shape = [n_samples, ], or [n_samples, n_classes] when `mlb` is given.
+            The target nodes, or binarized multi-label targets.
+
+        mlb : MultiLabelBinarizer or None
+            For multi-label targets, the MultiLabelBinarizer instance that was used for creating `targets`.
+
+        Returns
+        -------
+        resultset : list-of-lists - [n_samples]
+            For each target, the children of `source` from which that target is reachable.
+
+        """
+        children = self.children[self.node_ix[source]]
+
+        if mlb is not None and isinstance(targets, np.ndarray) and targets.ndim == 2:
+            # Multi-label targets, roll up each label and collect the results for every sample
+            label_rollup = self._rollup_unique(children, mlb.classes_)
+            return [
+                flatten_list(label_rollup[label] for label in row.nonzero()[0])
+                for row in targets
+            ]
+
+        unique_targets, inverse = np.unique(targets, return_inverse=True)
+        target_rollup = self._rollup_unique(children, unique_targets)
+        return [
+            target_rollup[ix]
+            for ix in inverse
+        ]
+
+    def _rollup_unique(self, children, targets):
+        target_ix = self.node_indices(targets)
+        known = target_ix >= 0
+
+        reachable = np.zeros((len(children), len(target_ix)), dtype=bool)
+        if len(children) and known.any():
+            reachable[:, known] = self.reachability[children][:, target_ix[known]].toarray()
+
+        child_nodes = [self.nodes[child_ix] for child_ix in children]
+        return [
+            [child_nodes[ix] for ix in np.flatnonzero(reachable[:, j])]
+            for j in range(len(target_ix))
+        ]
+
+
+def rollup_nodes(graph, source, targets, mlb=None, index=None):
     """Perform a "roll-up" of given target nodes up to the nodes immediately below
     given source node in given graph.
 
+    A precomputed `HierarchyIndex` for the graph can be passed in as `index`, which saves rebuilding it
+    when rolling up nodes for many sources of the same graph.
+
     """
-    result_cache = {}
-    resultset = []
-    for node_id in targets:
-        if mlb and type(node_id) == ndarray:
-            # multi-label binarizer was passed and node_id is an array, perform a roll-up
-            # for multi-label targets.
-            result_row = []
-            for label in node_id.nonzero()[0]:
-                if label not in result_cache:
-                    result_cache[label] = list(all_simple_paths(G=graph, source=source, target=mlb.classes_[label]))
-                all_paths = result_cache[label]
-                result_row.extend([
-                    path[1]
-                    for path in all_paths
-                ])
-            resultset.append(result_row)
-        else:
-            if node_id not in result_cache:
-                result_cache[node_id] = list(all_simple_paths(G=graph, source=source, target=node_id))
-            all_paths = result_cache[node_id]
-            resultset.append([
-                path[1]
-                for path in all_paths
-            ])
+    if index is None:
+        index = HierarchyIndex(graph)
+
+    resultset = index.rollup(source, targets, mlb=mlb)
 
     assert len(resultset) == len(targets)
 
@@ -5,10 +5,13 @@ Evaluation metrics for hierarchical classification.
 from contextlib import contextmanager
 
 import numpy as np
-from networkx import all_pairs_shortest_path_length, relabel_nodes
+from networkx import relabel_nodes
+from scipy.sparse import csr_matrix, issparse
 from sklearn.preprocessing import MultiLabelBinarizer
+from sklearn.utils.extmath import safe_sparse_dot
 
 from sklearn_hierarchical_classification.constants import ROOT
+from sklearn_hierarchical_classification.graph import HierarchyIndex
 
 
 @contextmanager
@@ -67,6 +70,42 @@ def multi_labeled(y_true, y_pred, graph):
     )
 
 
+def make_ancestors_matrix(graph, root=ROOT, n_classes=None):
+    """
+    Compute the ancestor closure of given class hierarchy, as a sparse boolean matrix.
+
+    Parameters
+    ----------
+    graph : the class hierarchy graph, given as a `networkx.DiGraph` instance
+        Node ids must be integer and correspond to the indices into the label matrices.
+
+    root : identifier of the (stub) root node of hierarchy
+
+    n_classes : int or None
+        Number of classes (columns) in the label matrices. Defaults to the largest node id + 1.
+
+    Returns
+    -------
+    ancestors : (sparse) csr_matrix, shape = [n_classes, n_classes]
+        Entry (i, j) is set when node j is either node i itself or one of its ancestors (other than the root).
+
+    """
+    index = HierarchyIndex(graph)
+    classes = [node for node in index.nodes if node != root]
+    ix = index.node_indices(classes)
+    classes = np.array(classes, dtype=np.intp)
+    if n_classes is None:
+        n_classes = classes.max() + 1 if len(classes) else 0
+
+    # Reachability is from ancestor to descendant, transpose it to map each node to its ancestors
+    closure = index.reachability.T.tocsr()[ix][:, ix].tocoo()
+
+    return csr_matrix(
+        (np.ones(closure.nnz, dtype=bool), (classes[closure.row], classes[closure.col])),
+        shape=(n_classes, n_classes),
+    )
+
+
 def fill_ancestors(y, graph, root, copy=True):
     """
     Compute the full ancestor set for y, where y is in binary multi-label format,
@@ -76,9 +115,12 @@ def fill_ancestors(y, graph, root, copy=True):
     to the ancestor nodes of those already marked with 1 in that row,
     based on the given class hierarchy graph.
 
+    This is done in one sparse matrix product of y with the ancestor closure of the
+    hierarchy (see `make_ancestors_matrix`).
+
     Parameters
     ----------
-    y : array-like, shape = [n_samples, n_classes].
+    y : (sparse) array-like, shape = [n_samples, n_classes].
         multi-class targets, corresponding to graph node integer ids.
 
     graph : the class hierarchy graph, given as a `networkx.DiGraph` instance
@@ -86,28 +128,126 @@ def fill_ancestors(y, graph, root, copy=True):
     root : identifier of the (stub) root node of hierarchy
 
     copy : bool, whether to update the y array in-place. defaults to True.
+        Sparse matrices are never updated in-place.
 
     Returns
     -------
-    y_ : array-like, shape = [n_samples, n_classes].
+    y_ : (sparse) array-like, shape = [n_samples, n_classes].
         multi-class targets, corresponding to graph node integer ids with
         all ancestors of existing labels in matrix filled in, per row.
 
     """
+    ancestors = make_ancestors_matrix(graph, root=root, n_classes=y.shape[1])
+    return _fill_ancestors(y, ancestors, copy=copy)
+
+
+def _fill_ancestors(y, ancestors, copy=True):
+    if issparse(y):
+        y_ = safe_sparse_dot(csr_matrix(y != 0, dtype=np.int32), ancestors.astype(np.int32))
+        return (y_ > 0).astype(y.dtype)
+
+    filled = safe_sparse_dot((y != 0).astype(np.int32), ancestors.astype(np.int32), dense_output=True)
     y_ = y.copy() if copy else y
-    paths = all_pairs_shortest_path_length(graph.reverse(copy=False))
-    for target, distances in paths:
-        if target == root:
-            # Our stub root node, can skip
-            continue
-        ix_rows = np.where(y[:, target] > 0)[0]
-        # all ancestors, except the last one which would be the root node
-        ancestors = list(distances.keys())[:-1]
-        y_[tuple(np.meshgrid(ix_rows, ancestors))] = 1
-    graph.reverse(copy=False)
+    y_[filled > 0] = 1
     return y_
 
 
+def _column_counts(y):
+    """Count non-zero entries in each column of a (sparse) matrix."""
+    if issparse(y):
+        y = csr_matrix(y)
+        return np.bincount(y.indices[y.data != 0], minlength=y.shape[1])
+    return np.count_nonzero(y, axis=0)
+
+
+def _safe_divide(numerator, denominator):
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator != 0)
+
+
+def h_precision_recall_fscore_support(y_true, y_pred, class_hierarchy, beta=1., average="micro", root=ROOT):
+    """
+    Calculate the hierarchical precision ("hP"), recall ("hR") and F-beta ("hF_{\beta}") metrics
+    together, based on given set of true class labels and predicated class labels, and the
+    class hierarchy graph.
+
+    The ancestor sets of `y_true` and `y_pred` are computed only once, which makes this cheaper than
+    calling `h_precision_score`, `h_recall_score` and `h_fbeta_score` separately.
+
+    Note that the format expected here for `y_true` and `y_pred` is a
+    binary multi-label matrix format, e.g. as can be generated by scikit-learn's
+    MultiLabelBinarizer.
+
+    Parameters
+    ----------
+    y_true : (sparse) array-like, shape = [n_samples, n_classes].
+        Ground truth multi-class targets.
+
+    y_pred : (sparse) array-like, shape = [n_samples, n_classes].
+        Predicted multi-class targets.
+
+    class_hierarchy : the class hierarchy graph, given as a `networkx.DiGraph` instance
+        Node ids must be integer and correspond to the indices into the y_true / y_pred matrices.
+
+    beta: float
+        the beta parameter for the F-beta score. Defaults to F1 score (beta=1).
+
+    average : "micro", "macro", or None
+        The averaging to perform:
+        * "micro" - count true positives, predicted and true labels globally, over all classes.
+        * "macro" - compute metrics for each class (including its ancestor-filled labels), and take their mean.
+        * None - return the metrics for each class.
+
+    Returns
+    -------
+    hP : float, or array of float, shape = [n_classes]
+        The computed hierarchical precision score(s).
+
+    hR : float, or array of float, shape = [n_classes]
+        The computed hierarchical recall score(s).
+
+    hF : float, or array of float, shape = [n_classes]
+        The computed hierarchical F-beta score(s).
+
+    support : None, or array of int, shape = [n_classes]
+        The number of occurrences of each class in `y_true`, once ancestors are filled in.
+        Only returned when `average` is None, otherwise None.
+
+    """
+    if average not in ("micro", "macro", None):
+        raise ValueError("'average' must be set to one of: micro, macro, None.")
+
+    ancestors = make_ancestors_matrix(class_hierarchy, root=root, n_classes=y_true.shape[1])
+    y_true_ = _fill_ancestors(y_true, ancestors)
+    y_pred_ = _fill_ancestors(y_pred, ancestors)
+
+    if issparse(y_true_) or issparse(y_pred_):
+        y_both_ = csr_matrix(y_true_ != 0).multiply(csr_matrix(y_pred_ != 0))
+    else:
+        y_both_ = (y_true_ != 0) & (y_pred_ != 0)
+
+    true_positives = _column_counts(y_both_)
+    pred_positives = _column_counts(y_pred_)
+    all_positives = _column_counts(y_true_)
+
+    if average == "micro":
+        true_positives = true_positives.sum()
+        pred_positives = pred_positives.sum()
+        all_positives = all_positives.sum()
+
+    hP = _safe_divide(true_positives, pred_positives)
+    hR = _safe_divide(true_positives, all_positives)
+    hF = _safe_divide((1. + beta ** 2.) * hP * hR, beta ** 2. * hP + hR)
+
+    if average == "micro":
+        return float(hP), float(hR), float(hF), None
+    elif average == "macro":
+        return hP.mean(), hR.mean(), hF.mean(), None
+
+    return hP, hR, hF, all_positives
+
+
 def h_precision_score(y_true, y_pred, class_hierarchy, root=ROOT):
     """
     Calculate the micro-averaged hierarchical precision ("hR") metric based on
@@ -127,10 +267,10 @@ def h_precision_score(y_true, y_pred, class_hierarchy, root=ROOT):
 
     Parameters
     ----------
-    y_true : array-like, shape = [n_samples, n_classes].
+    y_true : (sparse) array-like, shape = [n_samples, n_classes].
         Ground truth multi-class targets.
 
-    y_pred : array-like, shape = [n_samples, n_classes].
+    y_pred : (sparse) array-like, shape = [n_samples, n_classes].
         Predicted multi-class targets.
 
     class_hierarchy : the class hierarchy graph, given as a `networkx.DiGraph` instance
@@ -142,15 +282,8 @@ def h_precision_score(y_true, y_pred, class_hierarchy, root=ROOT):
         The computed (micro-averaged) hierarchical precision score.
 
     """
-    y_true_ = fill_ancestors(y_true, graph=class_hierarchy, root=root)
-    y_pred_ = fill_ancestors(y_pred, graph=class_hierarchy, root=root)
-
-    ix = np.where((y_true_ != 0) & (y_pred_ != 0))
-
-    true_positives = len(ix[0])
-    all_results = np.count_nonzero(y_pred_)
-
-    return true_positives / all_results
+    hP, _, _, _ = h_precision_recall_fscore_support(y_true, y_pred, class_hierarchy, root=root)
+    return hP
 
 
 def h_recall_score(y_true, y_pred, class_hierarchy, root=ROOT):
@@ -172,10 +305,10 @@ def h_recall_score(y_true, y_pred, class_hierarchy, root=ROOT):
 
     Parameters
     ----------
-    y_true : array-like, shape = [n_samples, n_classes].
+    y_true : (sparse) array-like, shape = [n_samples, n_classes].
         Ground truth multi-class targets.
 
-    y_pred : array-like, shape = [n_samples, n_classes].
+    y_pred : (sparse) array-like, shape = [n_samples, n_classes].
         Predicted multi-class targets.
 
     class_hierarchy : the class hierarchy graph, given as a `networkx.DiGraph` instance.
@@ -187,15 +320,8 @@ def h_recall_score(y_true, y_pred, class_hierarchy, root=ROOT):
         The computed (micro-averaged) hierarchical recall score.
 
     """
-    y_true_ = fill_ancestors(y_true, graph=class_hierarchy, root=root)
-    y_pred_ = fill_ancestors(y_pred, graph=class_hierarchy, root=root)
-
-    ix = np.where((y_true_ != 0) & (y_pred_ != 0))
-
-    true_positives = len(ix[0])
-    all_positives = np.count_nonzero(y_true_)
-
-    return true_positives / all_positives
+    _, hR, _, _ = h_precision_recall_fscore_support(y_true, y_pred, class_hierarchy, root=root)
+    return hR
 
 
 def h_fbeta_score(y_true, y_pred, class_hierarchy, beta=1., root=ROOT):
@@ -217,10 +343,10 @@ def h_fbeta_score(y_true, y_pred, class_hierarchy, beta=1., root=ROOT):
 
     Parameters
     ----------
-    y_true : array-like, shape = [n_samples, n_classes].
+    y_true : (sparse) array-like, shape = [n_samples, n_classes].
         Ground truth multi-class targets.
 
-    y_pred : array-like, shape = [n_samples, n_classes].
+    y_pred : (sparse) array-like, shape = [n_samples, n_classes].
         Predicted multi-class targets.
 
     class_hierarchy : the class hierarchy graph, given as a `networkx.DiGraph` instance
@@ -235,6 +361,5 @@ def h_fbeta_score(y_true, y_pred, class_hierarchy, beta=1., root=ROOT):
         The computed (micro-averaged) hierarchical F-score.
 
     """
-    hP = h_precision_score(y_true, y_pred, class_hierarchy, root=root)
-    hR = h_recall_score(y_true, y_pred, class_hierarchy, root=root)
-    return (1. + beta ** 2.) * hP * hR / (beta ** 2. * hP + hR)
+    _, _, hFscore, _ = h_precision_recall_fscore_support(y_true, y_pred, class_hierarchy, beta=beta, root=root)
+    return hFscore
@@ -0,0 +1,135 @@
+"""
+Compact serialization of fitted hierarchical classifiers.
+
+"""
+import joblib
+import numpy as np
+from networkx import DiGraph
+
+from sklearn_hierarchical_classification.constants import CLASSIFIER, TRAINING_ROWS
+from sklearn_hierarchical_classification.graph import HierarchyIndex
+
+
+# Version of the serialization format written by `save`
+FORMAT_VERSION = 2
+
+# Node attributes which are only needed while training, and are not serialized
+TRAINING_ATTRIBUTES = (TRAINING_ROWS,)
+
+# Fitted attributes which are serialized in their own compact form, or re-built when loading
+_DERIVED_ATTRIBUTES = ("class_hierarchy_", "estimators_", "graph_", "hierarchy_index_", "plan_")
+
+
+def save(clf, path):
+    """
+    Save a fitted hierarchical classifier to a file.
+
+    Training artifacts (e.g the training rows of each node) are dropped, and the class hierarchy is stored as
+    an integer edge list over the node labels. The compiled inference plan is stored as is, including the stacked
+    parameters of fused linear models (see `HierarchicalClassifier.compile`), and shares the local classifiers
+    with the nodes of the class hierarchy. The file is written uncompressed, so that every numpy array in it,
+    and in particular the parameters of the local classifiers (coefficients, intercepts, class maps) and the tables
+    of the inference plan, is stored as a contiguous buffer which `load` can memory-map instead of reading
+    into memory.
+
+    Parameters
+    ----------
+    clf : HierarchicalClassifier
+        The fitted classifier to save.
+
+    path : str
+        Path to the file to write.
+
+    """
+    graph = clf.graph_
+    nodes = list(graph.nodes())
+    node_ix = {
+        node: ix
+        for ix, node in enumerate(nodes)
+    }
+    edges = np.array(
+        [(node_ix[source], node_ix[target]) for source, target in graph.edges()],
+        dtype=np.intp,
+    ).reshape(-1, 2)
+
+    node_attributes = [
+        {
+            key: value
+            for key, value in graph.nodes[node].items()
+            if key not in TRAINING_ATTRIBUTES
+        }
+        for node in nodes
+    ]
+    fitted_attributes = {
+        key: value
+        for key, value in vars(clf).items()
+        if key.endswith("_") and key not in _DERIVED_ATTRIBUTES
+    }
+
+    joblib.dump(
+        dict(
+            format_version=FORMAT_VERSION,
+            estimator_class=type(clf),
+            params=clf.get_params(deep=False),
+            nodes=nodes,
+            edges=edges,
+            node_attributes=node_attributes,
+            fitted_attributes=fitted_attributes,
+            plan=clf.plan_,
+        ),
+        path,
+    )
+
+
+def load(path, mmap_mode="r"):
+    """
+    Load a hierarchical classifier saved with `save`.
+
+    Parameters
+    ----------
+    path : str
+        Path to the file to read.
+
+    mmap_mode : None, "r+", "r", "w+", "c"
+        Memory-mapping mode for numpy arrays, see `numpy.load`. With the default read-only mode, the parameters
+        of the local classifiers are paged in from the file on demand and shared between processes loading
+        the same file. This includes the inference plan, which is not re-compiled. Use None to read everything
+        into memory.
+
+    Returns
+    -------
+    clf : HierarchicalClassifier
+        The fitted classifier, ready for prediction.
+
+    """
+    state = joblib.load(path, mmap_mode=mmap_mode)
+    if state.get("format_version") != FORMAT_VERSION:
+        raise ValueError(
+            "Unsupported serialization format version: {!r} (expected {}).".format(
+                state.get("format_version"),
+                FORMAT_VERSION,
+            )
+        )
+
+    nodes = state["nodes"]
+    graph = DiGraph()
+    for node, attributes in zip(nodes, state["node_attributes"]):
+        graph.add_node(node, **attributes)
+    graph.add_edges_from((nodes[source], nodes[target]) for source, target in state["edges"])
+
+    clf = state["estimator_class"](**state["params"])
+    clf.__dict__.update(state["fitted_attributes"])
+    clf.class_hierarchy_ = {
+        node: list(graph.successors(node))
+        for node in nodes
+    }
+    clf.graph_ = graph
+    clf.hierarchy_index_ = HierarchyIndex(graph)
+    clf.estimators_ = {
+        node: attributes[CLASSIFIER]
+        for node, attributes in graph.nodes(data=True)
+        if CLASSIFIER in attributes
+    }
+    clf.plan_ = state["plan"]
+
+    return clf
@@ -0,0 +1,328 @@
+"""
+Compiled inference plan for fitted class hierarchies.
+
+"""
+import numpy as np
+from networkx import topological_sort
+from scipy.special import expit
+from sklearn.dummy import DummyClassifier
+from sklearn.linear_model import (
+    LogisticRegression,
+    PassiveAggressiveClassifier,
+    Perceptron,
+    RidgeClassifier,
+    SGDClassifier,
+)
+from sklearn.svm import LinearSVC
+from sklearn.utils.extmath import safe_sparse_dot
+
+from sklearn_hierarchical_classification.constants import CLASSIFIER
+
+
+# Classifiers whose decision function is linear in their `coef_` and `intercept_` parameters
+LINEAR_CLASSIFIERS = (
+    LinearSVC,
+    LogisticRegression,
+    PassiveAggressiveClassifier,
+    Perceptron,
+    RidgeClassifier,
+    SGDClassifier,
+)
+
+# Number of samples scored at once by fused linear models, bounding the size of the [n_samples, n_local_classes]
+# score matrices computed
+FUSED_BATCH_SIZE = 4096
+
+
+class InferencePlan(object):
+    """
+    Flattened, array-based representation of a fitted class hierarchy, used at prediction time.
+
+    Nodes are assigned integer ids (their position in `nodes`), and the local classifiers
+    are assigned integer "slots" (their position in `classifiers`). Walking the hierarchy then
+    amounts to integer table lookups, without touching the networkx graph or hashing class labels.
+
+    Parameters
+    ----------
+    graph : the fitted class hierarchy graph, given as a `networkx.DiGraph` instance,
+        with local classifiers stored on its nodes.
+
+    root : the root node of the hierarchy.
+
+    classes : list
+        The flat list of class labels, defining the columns of probability estimates.
+
+    mlb : MultiLabelBinarizer or None
+        For multi-label classification, the MultiLabelBinarizer instance that was used for creating the y variable.
+        Local classes are then column indices of the binarized targets.
+
+    Attributes
+    ----------
+    nodes : array, shape = [n_nodes]
+        The graph nodes, indexed by their integer id.
+
+    root : int
+        The integer id of the root node.
+
+    node_columns : array, shape = [n_nodes]
+        For each node, its column index in `classes`, or -1 for nodes which are not a class (e.g the root node).
+
+    children_indptr, children : arrays
+        The children of node i are `children[children_indptr[i]:children_indptr[i + 1]]`.
+
+    order : array, shape = [n_nodes]
+        The integer node ids, in topological order (i.e every node comes before its children).
+
+    classifier_slot : array, shape = [n_nodes]
+        For each node, the slot of its local classifier, or -1 for nodes without a classifier.
+
+    classifiers : list
+        The local classifiers, indexed by slot.
+
+    slot_nodes : array, shape = [n_classifiers]
+        For each slot, the integer id of the node the classifier belongs to.
+
+    local_indptr, local_targets, local_columns : arrays
+        For the classifier in slot s, local class i corresponds to node `local_targets[local_indptr[s] + i]`
+        and to column `local_columns[local_indptr[s] + i]` in probability estimates.
+
+    fused : FusedLinearModel or None
+        When set (see `fuse_linear`), the stacked parameters of all local classifiers.
+
+    """
+
+    def __init__(self, graph, root, classes, mlb=None):
+        self.nodes = np.empty(graph.number_of_nodes(), dtype=object)
+        self.nodes[:] = list(graph.nodes())
+        node_ix = {
+            node: ix
+            for ix, node in enumerate(self.nodes)
+        }
+        class_ix = {
+            class_: ix
+            for ix, class_ in enumerate(classes)
+        }
+
+        self.root = node_ix[root]
+        self.node_columns = np.array([class_ix.get(node, -1) for node in self.nodes], dtype=np.intp)
+
+        children = [
+            [node_ix[child] for child in graph.successors(node)]
+            for node in self.nodes
+        ]
+        self.children_indptr = np.concatenate(([0], np.cumsum([len(ixs) for ixs in children]))).astype(np.intp)
+        self.children = np.array([ix for ixs in children for ix in ixs], dtype=np.intp)
+        self.order = np.array([node_ix[node] for node in topological_sort(graph)], dtype=np.intp)
+
+        self.classifier_slot = np.full(len(self.nodes), -1, dtype=np.intp)
+        self.classifiers = []
+        slot_nodes, local_targets, local_columns = [], [], []
+
+        for ix, node in enumerate(self.nodes):
+            clf = graph.nodes[node].get(CLASSIFIER, None)
+            if clf is None:
+                continue
+
+            self.classifier_slot[ix] = len(self.classifiers)
+            self.classifiers.append(clf)
+            slot_nodes.append(ix)
+
+            if mlb is not None:
+                # In multi-label mode local classes are already column indices of the binarized targets
+                local_columns.append(np.asarray(clf.classes_, dtype=np.intp))
+                local_targets.append(np.array([node_ix[mlb.classes_[class_]] for class_ in clf.classes_]))
+                continue
+
+            try:
+                local_targets.append(np.array([node_ix[class_] for class_ in clf.classes_], dtype=np.intp))
+            except KeyError as error:
+                # This may happen if the classes_ enumeration we construct during fit()
+                # has a mismatch with the individual node classifiers" classes_.
+                raise ValueError(
+                    "Could not find class {!r} (type: {}) of classifier at node {} in class hierarchy".format(
+                        error.args[0],
+                        type(error.args[0]),
+                        node,
+                    )
+                )
+            local_columns.append(self.node_columns[local_targets[-1]])
+
+        self.slot_nodes = np.array(slot_nodes, dtype=np.intp)
+        self.local_indptr = np.concatenate(([0], np.cumsum([len(ixs) for ixs in local_targets]))).astype(np.intp)
+        self.local_targets = np.concatenate(local_targets).astype(np.intp) if local_targets else np.empty(0, np.intp)
+        self.local_columns = np.concatenate(local_columns).astype(np.intp) if local_columns else np.empty(0, np.intp)
+        self.fused = None
+
+    @property
+    def n_nodes(self):
+        return len(self.nodes)
+
+    @property
+    def n_classifiers(self):
+        return len(self.classifiers)
+
+    def node_children(self, node):
+        """Return the integer ids of the children of given node."""
+        return self.children[self.children_indptr[node]:self.children_indptr[node + 1]]
+
+    def slot_targets(self, slot):
+        """Return the integer node ids of the local classes of the classifier in given slot."""
+        return self.local_targets[self.local_indptr[slot]:self.local_indptr[slot + 1]]
+
+    def slot_columns(self, slot):
+        """Return the column indices of the local classes of the classifier in given slot."""
+        return self.local_columns[self.local_indptr[slot]:self.local_indptr[slot + 1]]
+
+    def fuse_linear(self, use_decision_function=False):
+        """
+        Stack the parameters of all local classifiers into a single linear model, see `FusedLinearModel`.
+
+        Raises
+        ------
+        ValueError
+            If any of the local classifiers is not a supported linear model.
+
+        """
+        self.fused = FusedLinearModel(self, use_decision_function=use_decision_function)
+        return self.fused
+
+
+class FusedLinearModel(object):
+    """
+    The local classifiers of an inference plan, stacked into a single linear model.
+
+    When every local classifier is linear, the scores of all of them for a batch of samples can be computed
+    with a single matrix product against a block matrix of their stacked `coef_` and `intercept_`. The
+    probability estimates of each local classifier are then recovered by applying a softmax (or normalized
+    sigmoid, for one-vs-rest models) over the columns of its own segment.
+
+    Supported local classifiers are:
+    * `LogisticRegression`, for both `predict_proba` and `decision_function` scores.
+    * Any other linear classifier (see `LINEAR_CLASSIFIERS`, e.g `LinearSVC` or `SGDClassifier`),
+      for `decision_function` scores only.
+    * Constant `DummyClassifier` instances with a single class, as fitted for nodes with a single child.
+
+    Parameters
+    ----------
+    plan : InferencePlan
+
+    use_decision_function : bool
+        Whether to reproduce `decision_function` (rather than `predict_proba`) scores of the local classifiers.
+
+    Attributes
+    ----------
+    coef : array-like, shape = [n_features, n_local_classes]
+        Stacked coefficients, the columns of the classifier in slot s being
+        `plan.local_indptr[s]:plan.local_indptr[s + 1]`.
+
+    intercept : array-like, shape = [n_local_classes]
+        Stacked intercepts.
+
+    kinds : array-like, shape = [n_classifiers]
+        How scores of each classifier are computed from its segment, one of the `FusedLinearModel.*` kinds.
+
+    """
+
+    RAW = 0
+    SOFTMAX = 1
+    SIGMOID = 2
+    CONSTANT = 3
+
+    def __init__(self, plan, use_decision_function=False):
+        self.use_decision_function = use_decision_function
+        self.starts = plan.local_indptr[:-1]
+        self.lengths = np.diff(plan.local_indptr)
+
+        n_features = {
+            clf.coef_.shape[1]
+            for clf in plan.classifiers
+            if hasattr(clf, "coef_")
+        }
+        if len(n_features) != 1:
+            raise ValueError("Fused inference requires linear local classifiers trained on the same features.")
+        n_features = n_features.pop()
+
+        blocks = [
+            self._linear_block(clf, n_features)
+            for clf in plan.classifiers
+        ]
+        self.coef = np.vstack([coef for coef, _, _ in blocks]).T
+        self.intercept = np.concatenate([intercept for _, intercept, _ in blocks])
+        self.kinds = np.array([kind for _, _, kind in blocks], dtype=np.intp)
+
+    def _linear_block(self, clf, n_features):
+        n_classes = len(clf.classes_)
+
+        if isinstance(clf, DummyClassifier) and n_classes == 1:
+            return np.zeros((1, n_features)), np.zeros(1), self.CONSTANT
+
+        if self.use_decision_function and _is_linear(clf):
+            kind = self.RAW
+        elif isinstance(clf, LogisticRegression):
+            kind = self.SOFTMAX if _is_multinomial(clf) else self.SIGMOID
+        else:
+            raise ValueError(
+                "Fused inference does not support local classifiers of type {}.".format(type(clf).__name__)
+            )
+
+        coef = np.asarray(clf.coef_ if not hasattr(clf.coef_, "toarray") else clf.coef_.toarray())
+        intercept = np.broadcast_to(clf.intercept_, (coef.shape[0],)).astype(np.float64)
+        if n_classes == 2:
+            if kind == self.SIGMOID:
+                # Binary one-vs-rest probabilities are [1 - sigmoid(d), sigmoid(d)], which is a softmax over [0, d]
+                return np.vstack((np.zeros_like(coef), coef)), np.array([0., intercept[0]]), self.SOFTMAX
+            # Binary scores are reported as [-d, d], see `HierarchicalClassifier._local_scores`
+            return np.vstack((-coef, coef)), np.array([-intercept[0], intercept[0]]), kind
+
+        return coef, intercept, kind
+
+    def scores(self, X):
+        """
+        Compute the scores of all local classifiers for given samples.
+
+        Returns
+        -------
+        scores : array-like, shape = [n_samples, n_local_classes]
+            The scores of the classifier in slot s are in columns `plan.local_indptr[s]:plan.local_indptr[s + 1]`.
+
+        """
+        Z = safe_sparse_dot(X, self.coef, dense_output=True) + self.intercept
+        if not len(self.kinds):
+            return Z
+
+        column_kinds = np.repeat(self.kinds, self.lengths)
+        column_segments = np.repeat(np.arange(len(self.kinds)), self.lengths)
+
+        softmax = column_kinds == self.SOFTMAX
+        if softmax.any():
+            Z_max = np.maximum.reduceat(Z, self.starts, axis=1)[:, column_segments]
+            Z[:, softmax] = np.exp(Z[:, softmax] - Z_max[:, softmax])
+
+        sigmoid = column_kinds == self.SIGMOID
+        if sigmoid.any():
+            Z[:, sigmoid] = expit(Z[:, sigmoid])
+
+        Z[:, column_kinds == self.CONSTANT] = 1.
+
+        normalize = column_kinds != self.RAW
+        if normalize.any():
+            Z_sum = np.add.reduceat(Z, self.starts, axis=1)[:, column_segments]
+            Z[:, normalize] /= Z_sum[:, normalize]
+
+        return Z
+
+
+def _is_linear(clf):
+    """Whether a fitted classifier computes its decision function as a linear model of its parameters."""
+    return isinstance(clf, LINEAR_CLASSIFIERS) and all(
+        hasattr(clf, attribute)
+        for attribute in ("coef_", "intercept_", "decision_function")
+    )
+
+
+def _is_multinomial(clf):
+    """Whether a fitted LogisticRegression instance computes probabilities with a softmax, as in its predict_proba."""
+    multi_class = getattr(clf, "multi_class", "auto")
+    if multi_class in ("auto", "deprecated"):
+        return len(clf.classes_) > 2 and clf.solver != "liblinear"
+    return multi_class == "multinomial"
@@ -0,0 +1,186 @@
+"""
+Per-node instrumentation of fitting and prediction.
+
+"""
+import csv
+import tracemalloc
+from contextlib import contextmanager
+from time import perf_counter
+
+import numpy as np
+from scipy.sparse import issparse
+from sklearn.utils.validation import _num_samples
+
+
+# Statistics recorded for each node when fitting
+FIT_STATS_FIELDS = (
+    "build_features_time",
+    "train_time",
+    "n_samples",
+    "n_features",
+    "nnz",
+    "data_nbytes",
+    "peak_memory",
+)
+
+# Statistics recorded for each node when predicting
+PREDICT_STATS_FIELDS = (
+    "n_calls",
+    "n_samples",
+    "predict_time",
+)
+
+
+class NodeStats(object):
+    """
+    Statistics recorded for each node of the class hierarchy.
+
+    Holds a record of named numeric fields per node. Records are exported as plain python structures
+    (see `to_dict`, `to_records`) or as CSV (see `to_csv`), e.g for loading into a data frame.
+
+    Parameters
+    ----------
+    fields : list of str
+        The names of the fields recorded for each node.
+
+    """
+
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self._records = {}
+
+    def __contains__(self, node_id):
+        return node_id in self._records
+
+    def __getitem__(self, node_id):
+        return self._records[node_id]
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+    def _record(self, node_id):
+        if node_id not in self._records:
+            self._records[node_id] = dict.fromkeys(self.fields)
+        return self._records[node_id]
+
+    def set(self, node_id, **values):
+        """Set the value of given fields for given node."""
+        self._record(node_id).update(values)
+
+    def add(self, node_id, **values):
+        """Add to the value of given fields for given node, e.g for accumulating timings."""
+        record = self._record(node_id)
+        for field, value in values.items():
+            record[field] = value if record[field] is None else record[field] + value
+
+    def top(self, field, n=10):
+        """Return the (up to) n nodes with the largest value of given field, in decreasing order."""
+        nodes = [
+            node_id
+            for node_id, record in self._records.items()
+            if record[field] is not None
+        ]
+        return sorted(nodes, key=lambda node_id: self._records[node_id][field], reverse=True)[:n]
+
+    def to_dict(self):
+        """Return the statistics as a dictionary mapping each node to a dictionary of its fields."""
+        return {
+            node_id: dict(record)
+            for node_id, record in self._records.items()
+        }
+
+    def to_records(self):
+        """Return the statistics as a list of dictionaries, one per node, with the node under the "node" key."""
+        return [
+            dict(node=node_id, **record)
+            for node_id, record in self._records.items()
+        ]
+
+    def to_csv(self, path_or_buf):
+        """
+        Write the statistics as CSV, with a header row and one row per node.
+
+        Parameters
+        ----------
+        path_or_buf : str or file-like object
+            Path of the file to write, or an open file-like object to write to.
+
+        """
+        if isinstance(path_or_buf, str):
+            with open(path_or_buf, "w", newline="") as buf:
+                return self.to_csv(buf)
+
+        writer = csv.DictWriter(path_or_buf, fieldnames=("node",) + self.fields)
+        writer.writeheader()
+        writer.writerows(self.to_records())
+
+
+def data_stats(X, y):
+    """
+    Compute the size statistics of a training set.
+
+    Returns
+    -------
+    stats : dict
+        The number of samples, and when X is a (sparse) matrix, its number of features, number of non-zero
+        entries and the number of bytes taken by X and y.
+
+    """
+    stats = dict(n_samples=_num_samples(X))
+    if issparse(X):
+        stats.update(
+            n_features=X.shape[1],
+            nnz=X.nnz,
+            data_nbytes=X.data.nbytes + X.indices.nbytes + X.indptr.nbytes,
+        )
+    elif isinstance(X, np.ndarray):
+        stats.update(
+            n_features=X.shape[1] if X.ndim > 1 else None,
+            nnz=np.count_nonzero(X),
+            data_nbytes=X.nbytes,
+        )
+
+    if "data_nbytes" in stats and isinstance(y, np.ndarray):
+        stats["data_nbytes"] += y.nbytes
+
+    return stats
+
+
+@contextmanager
+def measure(trace_memory=True):
+    """
+    Measure the wall-clock time and peak memory allocated within a block.
+
+    Peak memory is only measured when memory allocations are being traced by `tracemalloc`, e.g when
+    running python with the `PYTHONTRACEMALLOC` environment variable set, and is None otherwise.
+    It is the peak of all memory allocated by the process while in the block, and is therefore only
+    attributable to the block when no other thread allocates memory concurrently.
+
+    Parameters
+    ----------
+    trace_memory : bool
+        Whether to measure peak memory. When False, it is always reported as None, and the peak
+        tracked by `tracemalloc` is left untouched, e.g for blocks running concurrently in threads.
+
+    Yields
+    ------
+    stats : dict
+        Filled with the "time" (in seconds) and "peak_memory" (in bytes) of the block when it exits.
+
+    """
+    stats = dict(time=None, peak_memory=None)
+    tracing = trace_memory and tracemalloc.is_tracing() and hasattr(tracemalloc, "reset_peak")
+    if tracing:
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+
+    start = perf_counter()
+    try:
+        yield stats
+    finally:
+        stats["time"] = perf_counter() - start
+        if tracing:
+            stats["peak_memory"] = max(tracemalloc.get_traced_memory()[1] - baseline, 0)
@@ -15,6 +15,7 @@ from sklearn.svm import LinearSVC
 
 from sklearn_hierarchical_classification.classifier import HierarchicalClassifier
 from sklearn_hierarchical_classification.constants import ROOT
+from sklearn_hierarchical_classification.datasets import make_hierarchical_dataset
 
 
 def make_class_hierarchy(n, n_intermediate=None, n_leaf=None):
@@ -103,6 +104,27 @@ def make_digits_dataset(targets=None, as_str=True):
     return X, y
 
 
+def make_text_dataset(class_hierarchy, n_samples=300, random_state=0):
+    """Create a dataset of raw text documents, with words drawn from a hierarchical mixture over given hierarchy."""
+    X, y = make_hierarchical_dataset(
+        class_hierarchy,
+        n_samples=n_samples,
+        n_features=300,
+        noise=0.5,
+        random_state=random_state,
+    )
+    documents = [
+        " ".join(
+            "w{}".format(feature)
+            for feature, count in zip(X[i].indices, X[i].data)
+            for _ in range(int(count))
+        )
+        for i in range(X.shape[0])
+    ]
+
+    return documents, y
+
+
 def make_classifier(base_estimator=None, class_hierarchy=None, **kwargs):
     return HierarchicalClassifier(
         class_hierarchy=class_hierarchy,
@@ -1,7 +1,13 @@
 import numpy as np
-from hamcrest import assert_that, equal_to, is_
+from hamcrest import assert_that, equal_to, instance_of, is_
+from scipy.sparse import csr_matrix
 
-from sklearn_hierarchical_classification.array import apply_rollup_Xy
+from sklearn_hierarchical_classification.array import (
+    RowsView,
+    apply_rollup_Xy,
+    apply_rollup_Xy_raw,
+    extract_rows_csr,
+)
 
 
 def test_apply_rollup_xy():
@@ -20,3 +26,98 @@ def test_apply_rollup_xy():
 
     for i in range(6):
         assert_that(y_[i], is_(equal_to(i)))
+
+
+def test_apply_rollup_xy_drops_rows_without_labels():
+    X = np.arange(9).reshape(3, 3)
+    y_rolled_up = [
+        [0, 1],
+        [],
+        [2],
+    ]
+
+    X_, y_ = apply_rollup_Xy(X, y_rolled_up)
+
+    assert_that(X_.toarray().tolist(), is_(equal_to([
+        [0, 1, 2],
+        [0, 1, 2],
+        [6, 7, 8],
+    ])))
+    assert_that(y_, is_(equal_to([0, 1, 2])))
+
+
+def test_apply_rollup_xy_raw():
+    X = ["a", "b", "c", "d"]
+    y_rolled_up = [
+        [0, 1],
+        [],
+        [2],
+        [3, 4, 5],
+    ]
+
+    X_, y_ = apply_rollup_Xy_raw(X, y_rolled_up)
+
+    assert_that(X_, is_(instance_of(RowsView)))
+    assert_that(list(X_.rows), is_(equal_to([0, 0, 2, 3, 3, 3])))
+    assert_that(list(X_), is_(equal_to(["a", "a", "c", "d", "d", "d"])))
+    assert_that(y_, is_(equal_to([0, 1, 2, 3, 4, 5])))
+
+
+def test_apply_rollup_xy_raw_without_expansion():
+    X = ["a", "b"]
+
+    X_, y_ = apply_rollup_Xy_raw(X, [[0], [1]])
+
+    assert_that(X_, is_(X))
+    assert_that(y_, is_(equal_to([0, 1])))
+
+
+def test_rows_view():
+    X = ["a", "b", "c", "d"]
+    view = RowsView(X, [3, 1, 1, 0])
+
+    assert_that(len(view), is_(equal_to(4)))
+    assert_that(view[0], is_(equal_to("d")))
+    assert_that(view[-1], is_(equal_to("a")))
+    assert_that(list(view[1:3]), is_(equal_to(["b", "b"])))
+
+    # Views of views refer to the underlying sequence directly
+    nested = view[np.array([0, 3])]
+    assert_that(nested.X, is_(X))
+    assert_that(list(nested), is_(equal_to(["d", "a"])))
+
+
+def test_extract_rows_csr():
+    X = csr_matrix(np.array([
+        [1, 0, 2],
+        [0, 0, 0],
+        [0, 3, 0],
+        [4, 5, 6],
+    ]))
+
+    X_ = extract_rows_csr(X, [3, 1, 2])
+
+    assert_that(X_.shape, is_(equal_to(X.shape)))
+    assert_that(X_.toarray().tolist(), is_(equal_to([
+        [0, 0, 0],
+        [0, 0, 0],
+        [0, 3, 0],
+        [4, 5, 6],
+    ])))
+
+
+def test_extract_rows_csr_compact():
+    X = csr_matrix(np.array([
+        [1, 0, 2],
+        [0, 0, 0],
+        [0, 3, 0],
+        [4, 5, 6],
+    ]))
+
+    X_, rows = extract_rows_csr(X, [3, 0], compact=True)
+
+    assert_that(list(rows), is_(equal_to([0, 3])))
+    assert_that(X_.toarray().tolist(), is_(equal_to([
+        [1, 0, 2],
+        [4, 5, 6],
+    ])))
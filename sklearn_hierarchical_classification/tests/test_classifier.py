@@ -2,33 +2,57 @@
 Unit-tests for the classifier interface.
 
 """
+import os
+from tempfile import TemporaryDirectory
+
 from hamcrest import (
     assert_that,
+    calling,
     close_to,
     contains_inanyorder,
     equal_to,
+    greater_than,
     has_entries,
     has_item,
+    instance_of,
     is_,
+    none,
+    not_none,
+    raises,
 )
 from networkx import DiGraph
-from numpy import where
+from numpy import argmax, array, diff, exp, where, zeros
 from sklearn import svm
+from sklearn.base import clone
+from sklearn.dummy import DummyClassifier
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import accuracy_score
 from sklearn.model_selection import train_test_split
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.multiclass import OneVsRestClassifier
 from sklearn.naive_bayes import MultinomialNB
 from sklearn.neighbors import KNeighborsClassifier
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import MultiLabelBinarizer
 from sklearn.utils.estimator_checks import check_estimator
 
+from sklearn_hierarchical_classification.callbacks import NodeCallback
 from sklearn_hierarchical_classification.classifier import HierarchicalClassifier
-from sklearn_hierarchical_classification.constants import CLASSIFIER, DEFAULT, ROOT
+from sklearn_hierarchical_classification.datasets import make_hierarchy
+from sklearn_hierarchical_classification.constants import (
+    CLASSIFIER,
+    DEFAULT,
+    METAFEATURES,
+    ROOT,
+    TRAINING_ROWS,
+)
 from sklearn_hierarchical_classification.tests.fixtures import (
     make_classifier,
     make_classifier_and_data,
     make_clothing_graph_and_data,
     make_digits_dataset,
     make_mlb_classifier_and_data_with_feature_extraction_pipeline,
+    make_text_dataset,
 )
 from sklearn_hierarchical_classification.tests.matchers import matches_graph
 
@@ -36,6 +60,61 @@ from sklearn_hierarchical_classification.tests.matchers import matches_graph
 RANDOM_STATE = 42
 
 
+def reference_predict(clf, x, node_id=ROOT):
+    """
+    Reference implementation of prediction for a single sample, walking down the class hierarchy one local
+    classifier at a time, against which the batched prediction of `HierarchicalClassifier` is tested.
+
+    Returns
+    -------
+    path, class_proba
+        The predicted path (in multi-label mode, the concatenation of the paths down every predicted label) and
+        the probability estimates for every class, or None, None if given node has no local classifier.
+
+    """
+    graph = clf.graph_
+    local_clf = graph.nodes[node_id].get(CLASSIFIER)
+    if local_clf is None:
+        return None, None
+
+    X = [x] if clf.feature_extraction == "raw" else x
+    path = [node_id]
+    class_proba = zeros(len(clf.classes_))
+
+    while local_clf is not None:
+        if clf.use_decision_function:
+            scores = local_clf.decision_function(X)[0]
+        else:
+            scores = local_clf.predict_proba(X)[0]
+
+        if clf.mlb is not None:
+            # Follow every label scored above threshold, local classes being columns of the binarized targets
+            predictions = []
+            for class_, score in zip(local_clf.classes_, scores):
+                class_proba[class_] = score
+                if score > clf.mlb_prediction_threshold:
+                    predictions.append(clf.mlb.classes_[class_])
+            for prediction in predictions:
+                child_path, child_proba = reference_predict(clf, x, node_id=prediction)
+                path.append(prediction)
+                if child_proba is not None:
+                    class_proba += child_proba
+                    path.extend(child_path)
+            break
+
+        for class_, score in zip(local_clf.classes_, scores):
+            class_proba[list(clf.classes_).index(class_)] = score
+
+        best = argmax(scores)
+        if clf.prediction_depth == "nmlnp" and path[-1] != clf.root and scores[best] < clf.stopping_criteria:
+            break
+
+        path.append(local_clf.classes_[best])
+        local_clf = graph.nodes[path[-1]].get(CLASSIFIER)
+
+    return path, class_proba
+
+
 def test_estimator_inteface():
     """Run the scikit-learn estimator compatability test suite."""
     check_estimator(HierarchicalClassifier())
@@ -324,3 +403,658 @@ def test_nmlnp_strategy_on_dag_with_dummy_classifier():
     y_pred = clf.predict(X_test)
 
     assert_that(list(y_pred), has_item("3a"))
+
+
+def test_batch_predict_matches_per_sample_predict():
+    """Test that batched prediction routes every sample the same as walking down the hierarchy on its own."""
+    class_hierarchy = {
+        ROOT: ["A", "B"],
+        "A": ["1", "5", "6", "7"],
+        "B": ["2", "3", "4", "8", "9"],
+    }
+    clf = make_classifier(
+        base_estimator=LogisticRegression(solver="lbfgs", max_iter=1000),
+        class_hierarchy=class_hierarchy,
+        prediction_depth="nmlnp",
+        stopping_criteria=0.9,
+    )
+    X, y = make_digits_dataset()
+
+    clf.fit(X, y)
+    y_pred = clf.predict(X)
+    expected = [
+        reference_predict(clf, X[i:i + 1])[0][-1]
+        for i in range(X.shape[0])
+    ]
+
+    assert_that(list(y_pred), is_(equal_to(expected)))
+
+
+def test_batch_predict_proba_matches_per_sample_predict_proba():
+    """Test that bulk probability estimates match those computed walking down the hierarchy for each sample."""
+    class_hierarchy = {
+        ROOT: ["A", "B"],
+        "A": [1, 7],
+        "B": [3, 8, 9],
+    }
+    clf = make_classifier(
+        base_estimator=LogisticRegression(solver="lbfgs", max_iter=1000),
+        class_hierarchy=class_hierarchy,
+    )
+    X, y = make_digits_dataset(
+        targets=[1, 7, 3, 8, 9],
+        as_str=False,
+    )
+
+    clf.fit(X, y)
+    y_proba = clf.predict_proba(X)
+    expected = array([
+        reference_predict(clf, X[i:i + 1])[1]
+        for i in range(X.shape[0])
+    ])
+
+    assert_that(y_proba.shape, is_(equal_to((X.shape[0], clf.n_classes_))))
+    assert_that(abs(y_proba - expected).max(), is_(close_to(0., delta=1e-9)))
+
+
+def test_parallel_training_matches_sequential_training():
+    """Test that training local classifiers in parallel yields the same model as training them sequentially."""
+    class_hierarchy = {
+        ROOT: ["A", "B"],
+        "A": [1, 7],
+        "B": [3, 8, 9],
+    }
+    X, y = make_digits_dataset(
+        targets=[1, 7, 3, 8, 9],
+        as_str=False,
+    )
+    clf = make_classifier(
+        base_estimator=LogisticRegression(solver="lbfgs", max_iter=1000),
+        class_hierarchy=class_hierarchy,
+    ).fit(X, y)
+    parallel_clf = make_classifier(
+        base_estimator=LogisticRegression(solver="lbfgs", max_iter=1000),
+        class_hierarchy=class_hierarchy,
+        n_jobs=2,
+    ).fit(X, y)
+
+    assert_that(sorted(parallel_clf.estimators_), is_(equal_to(sorted(clf.estimators_))))
+    assert_that(list(parallel_clf.predict(X)), is_(equal_to(list(clf.predict(X)))))
+
+
+def test_node_training_rows():
+    """Test that each node keeps the indices of its training rows rather than a copy of the data."""
+    G, (X, y) = make_clothing_graph_and_data(root=ROOT)
+    G.add_edge("Bottoms", "Pants")
+
+    clf = HierarchicalClassifier(
+        LogisticRegression(solver="lbfgs", max_iter=1_000),
+        class_hierarchy=G,
+        root=ROOT,
+    )
+    clf.fit(X, y)
+
+    assert_that(list(clf.graph_.nodes[ROOT][TRAINING_ROWS]), is_(equal_to(list(range(len(y))))))
+    # Samples labeled with an intermediate node are used for training its parent only
+    assert_that(list(clf.graph_.nodes["Mens"][TRAINING_ROWS]), is_(equal_to(list(where(y != "Mens")[0]))))
+    assert_that(list(clf.graph_.nodes["Bottoms"][TRAINING_ROWS]), is_(equal_to([])))
+
+
+def test_discard_training_data():
+    """Test that per-node training sets can be released after fitting, keeping metafeatures."""
+    G, (X, y) = make_clothing_graph_and_data(root=ROOT)
+    clf = HierarchicalClassifier(
+        LogisticRegression(solver="lbfgs", max_iter=1_000),
+        class_hierarchy=G,
+        root=ROOT,
+    )
+    clf.fit(X, y)
+
+    lean_clf = clone(clf).set_params(keep_training_data=False).fit(X, y)
+
+    for node_id in lean_clf.graph_.nodes():
+        assert_that(TRAINING_ROWS in lean_clf.graph_.nodes[node_id], is_(False))
+    assert_that(lean_clf.graph_.nodes[ROOT][METAFEATURES], is_(equal_to(clf.graph_.nodes[ROOT][METAFEATURES])))
+    assert_that(list(lean_clf.predict(X)), is_(equal_to(list(clf.predict(X)))))
+
+
+def test_fit_and_predict_stats():
+    """Test that per-node statistics are recorded when fitting and predicting."""
+    class_hierarchy = {
+        ROOT: ["A", "B"],
+        "A": [1, 7],
+        "B": [3, 8, 9],
+    }
+    clf = make_classifier(class_hierarchy=class_hierarchy, record_predict_stats=True)
+    X, y = make_digits_dataset(
+        targets=[1, 7, 3, 8, 9],
+        as_str=False,
+    )
+    clf.fit(X, y)
+
+    assert_that(clf.fit_stats_[ROOT], has_entries(n_samples=X.shape[0], n_features=X.shape[1]))
+    assert_that(clf.fit_stats_["A"]["n_samples"], is_(equal_to(sum((y == 1) | (y == 7)))))
+    for node_id in (ROOT, "A", "B"):
+        assert_that(clf.fit_stats_[node_id]["train_time"], is_(greater_than(0)))
+    assert_that(clf.fit_stats_.top("n_samples", n=1), is_(equal_to([ROOT])))
+
+    clf.predict(X)
+    clf.predict(X)
+
+    assert_that(clf.predict_stats_[ROOT], has_entries(n_calls=2, n_samples=2 * X.shape[0]))
+    assert_that(
+        clf.predict_stats_["A"]["n_samples"] + clf.predict_stats_["B"]["n_samples"],
+        is_(equal_to(2 * X.shape[0])),
+    )
+
+    # Prediction statistics are only recorded on demand
+    clf.set_params(record_predict_stats=False).fit(X, y).predict(X)
+    assert_that(len(clf.predict_stats_), is_(equal_to(0)))
+
+
+def test_compiled_inference_plan():
+    """Test that the fitted hierarchy is compiled into integer lookup tables."""
+    class_hierarchy = {
+        ROOT: ["A", "B"],
+        "A": [1, 7],
+        "B": [3, 8, 9],
+    }
+    clf = make_classifier(class_hierarchy=class_hierarchy)
+    X, y = make_digits_dataset(
+        targets=[1, 7, 3, 8, 9],
+        as_str=False,
+    )
+
+    clf.fit(X, y)
+    plan = clf.plan_
+
+    assert_that(plan.nodes[plan.root], is_(equal_to(ROOT)))
+    assert_that(plan.n_classifiers, is_(equal_to(3)))
+    assert_that(list(plan.nodes[plan.node_children(plan.root)]), contains_inanyorder("A", "B"))
+
+    for node, slot in zip(plan.nodes, plan.classifier_slot):
+        if slot < 0:
+            assert_that(CLASSIFIER in clf.graph_.nodes[node], is_(False))
+            continue
+        clf_ = plan.classifiers[slot]
+        assert_that(clf_, is_(clf.graph_.nodes[node][CLASSIFIER]))
+        assert_that(list(plan.nodes[plan.slot_targets(slot)]), is_(equal_to(list(clf_.classes_))))
+        assert_that(
+            [clf.classes_[column] for column in plan.slot_columns(slot)],
+            is_(equal_to(list(clf_.classes_))),
+        )
+
+
+def test_fused_linear_inference():
+    """Test that fused inference over stacked linear local classifiers matches calling each classifier."""
+    class_hierarchy = {
+        ROOT: ["A", "B", "C"],
+        "A": ["1", "5", "6", "7"],
+        "B": ["2", "3", "8", "9"],
+        "C": ["4"],
+    }
+    clf = make_classifier(class_hierarchy=class_hierarchy)
+    X, y = make_digits_dataset(targets=[1, 2, 3, 4, 5, 6, 7, 8, 9])
+
+    clf.fit(X, y)
+    y_pred, y_proba = clf.predict(X), clf.predict_proba(X)
+    clf.compile(fuse_linear=True)
+
+    assert_that(clf.plan_.fused, is_(not_none()))
+    assert_that(list(clf.predict(X)), is_(equal_to(list(y_pred))))
+    assert_that(abs(clf.predict_proba(X) - y_proba).max(), is_(close_to(0., delta=1e-9)))
+
+
+def test_fused_linear_inference_requires_linear_classifiers():
+    clf, (X, y) = make_classifier_and_data(
+        n_classes=5,
+        base_estimator=KNeighborsClassifier(),
+    )
+    clf.fit(X, y)
+
+    assert_that(calling(clf.compile).with_args(fuse_linear=True), raises(ValueError))
+
+
+def test_predict_topk():
+    """Test that beam search returns the k best leaf nodes along with their path log-probabilities."""
+    class_hierarchy = {
+        ROOT: ["A", "B"],
+        "A": [1, 7],
+        "B": [3, 8, 9],
+    }
+    clf = make_classifier(class_hierarchy=class_hierarchy)
+    X, y = make_digits_dataset(
+        targets=[1, 7, 3, 8, 9],
+        as_str=False,
+    )
+    clf.fit(X, y)
+
+    y_topk, scores = clf.predict_topk(X, k=6, beam_width=6)
+
+    assert_that(y_topk.shape, is_(equal_to((X.shape[0], 6))))
+    # All five leaves are found for every sample, and their path probabilities add up to one
+    assert_that(set(y_topk[:, :5].ravel()), is_(equal_to({1, 7, 3, 8, 9})))
+    assert_that(list(y_topk[:, 5]), is_(equal_to([None] * X.shape[0])))
+    assert_that(abs(exp(scores[:, :5]).sum(axis=1) - 1.).max(), is_(close_to(0., delta=1e-9)))
+    assert_that((diff(scores[:, :5], axis=1) <= 0).all(), is_(True))
+
+
+def test_marginal_predict_proba():
+    """Test that marginal probability estimates form a distribution over each level of the hierarchy."""
+    class_hierarchy = {
+        ROOT: ["A", "B"],
+        "A": [1, 7],
+        "B": [3, 8, 9],
+    }
+    clf = make_classifier(
+        class_hierarchy=class_hierarchy,
+        proba_mode="marginal",
+    )
+    X, y = make_digits_dataset(
+        targets=[1, 7, 3, 8, 9],
+        as_str=False,
+    )
+    clf.fit(X, y)
+
+    y_proba = clf.predict_proba(X)
+    columns = {class_: idx for idx, class_ in enumerate(clf.classes_)}
+
+    def marginal(*classes):
+        return y_proba[:, [columns[class_] for class_ in classes]].sum(axis=1)
+
+    assert_that(abs(marginal("A", "B") - 1.).max(), is_(close_to(0., delta=1e-9)))
+    assert_that(abs(marginal(1, 7, 3, 8, 9) - 1.).max(), is_(close_to(0., delta=1e-9)))
+    assert_that(abs(marginal(1, 7) - marginal("A")).max(), is_(close_to(0., delta=1e-9)))
+
+    y_topk, scores = clf.predict_topk(X, k=1)
+    assert_that(
+        abs(y_proba[range(X.shape[0]), [columns[class_] for class_ in y_topk[:, 0]]] - exp(scores[:, 0])).max(),
+        is_(close_to(0., delta=1e-9)),
+    )
+
+
+def test_partial_fit():
+    """Test that incrementally fitting on chunks of data learns a hierarchical classifier."""
+    class_hierarchy = {
+        ROOT: ["A", "B", "C"],
+        "A": ["1", "5", "6", "7"],
+        "B": ["2", "3", "8", "9", "0"],
+        "C": ["4"],
+    }
+    clf = make_classifier(
+        base_estimator=MultinomialNB(),
+        class_hierarchy=class_hierarchy,
+    )
+    X, y = make_digits_dataset(as_str=True)
+
+    for start in range(0, X.shape[0], 200):
+        clf.partial_fit(X[start:start + 200], y[start:start + 200])
+
+    assert_that(clf.graph_.nodes["C"][CLASSIFIER].classes_, is_(equal_to(["4"])))
+    assert_that(accuracy_score(y, clf.predict(X)), is_(close_to(1., delta=0.2)))
+
+
+def test_partial_fit_after_fit():
+    """Test that partial_fit updates a classifier fitted with fit, including on classes it was not fitted on."""
+    class_hierarchy = {
+        ROOT: ["A", "B"],
+        "A": [1, 2],
+        "B": [3, 4, 5],
+    }
+    clf = make_classifier(
+        base_estimator=MultinomialNB(),
+        class_hierarchy=class_hierarchy,
+    )
+    X, y = make_digits_dataset(targets=[1, 3, 4], as_str=False)
+    clf.fit(X, y)
+    assert_that(clf.graph_.nodes["A"][CLASSIFIER], is_(instance_of(DummyClassifier)))
+
+    X, y = make_digits_dataset(targets=[1, 2, 3, 4, 5], as_str=False)
+    for start in range(0, X.shape[0], 200):
+        clf.partial_fit(X[start:start + 200], y[start:start + 200])
+        assert_that(clf.plan_, is_(none()))
+
+    assert_that(list(clf.graph_.nodes["A"][CLASSIFIER].classes_), is_(equal_to([1, 2])))
+    assert_that(list(clf.graph_.nodes["B"][CLASSIFIER].classes_), is_(equal_to([3, 4, 5])))
+    assert_that(accuracy_score(y, clf.predict(X)), is_(close_to(1., delta=0.2)))
+    assert_that(clf.plan_, is_(not_none()))
+
+
+def test_partial_fit_requires_incremental_estimators():
+    """Test that partial_fit fails on base estimators that cannot be fitted incrementally."""
+    X, y = make_digits_dataset(as_str=False)
+
+    clf = make_classifier(base_estimator=LogisticRegression())
+    assert_that(calling(clf.partial_fit).with_args(X, y, classes=list(range(10))), raises(ValueError))
+
+    clf = make_classifier(base_estimator=MultinomialNB())
+    assert_that(calling(clf.partial_fit).with_args(X, y), raises(ValueError))
+
+
+def test_partial_fit_requires_lcpn():
+    X, y = make_digits_dataset(as_str=False)
+
+    clf = make_classifier(base_estimator=MultinomialNB(), algorithm="lcn", training_strategy="exclusive")
+    assert_that(calling(clf.partial_fit).with_args(X, y, classes=list(range(10))), raises(ValueError))
+
+
+def test_refit_affected():
+    """Test that re-fitting after a change to the class hierarchy only re-trains the affected local classifiers."""
+    class FitRecorder(NodeCallback):
+        def __init__(self):
+            self.fitted = []
+
+        def on_node_fit_start(self, node_id, X_shape, y_shape):
+            self.fitted.append(node_id)
+
+    class_hierarchy = {
+        ROOT: ["A", "B"],
+        "A": ["A1", "A2"],
+        "A1": [1, 5],
+        "A2": [6, 7],
+        "B": ["B1", "B2"],
+        "B1": [2, 3],
+        "B2": [8, 9, 0, 4],
+    }
+    new_class_hierarchy = dict(class_hierarchy, B1=[2, 3, 0], B2=[8, 9, 4])
+    X, y = make_digits_dataset(as_str=False)
+
+    recorder = FitRecorder()
+    clf = make_classifier(class_hierarchy=class_hierarchy, callbacks=[recorder]).fit(X, y)
+    classifiers = dict(clf.estimators_)
+    recorder.fitted = []
+
+    clf.refit_affected(X, y, new_class_hierarchy)
+
+    # Only the nodes whose training set changed (class 0 moved from B2 to B1, both under B) are re-trained,
+    # and the training data of the other nodes is not even materialized
+    dirty = ["B", "B1", "B2"]
+    assert_that(recorder.fitted, contains_inanyorder(*dirty))
+    for node_id in (ROOT, "A", "A1", "A2"):
+        assert_that(clf.graph_.nodes[node_id][CLASSIFIER], is_(classifiers[node_id]))
+        assert_that(clf.fit_stats_[node_id]["n_samples"], is_(none()))
+    for node_id in dirty:
+        assert_that(clf.graph_.nodes[node_id][CLASSIFIER] is classifiers[node_id], is_(False))
+        assert_that(clf.fit_stats_[node_id]["n_samples"], is_(not_none()))
+
+    assert_that(clf.class_hierarchy, is_(new_class_hierarchy))
+    assert_that(list(clf.graph_.nodes["B1"][CLASSIFIER].classes_), is_(equal_to([0, 2, 3])))
+
+    expected_clf = make_classifier(class_hierarchy=new_class_hierarchy).fit(X, y)
+    assert_that(list(clf.predict(X)), is_(equal_to(list(expected_clf.predict(X)))))
+
+
+def test_refit_affected_detects_changed_data():
+    """Test that local classifiers are not reused when re-fitting on different training data."""
+    class_hierarchy = {
+        ROOT: ["A", "B"],
+        "A": [1, 7],
+        "B": [3, 8, 9],
+    }
+    X, y = make_digits_dataset(targets=[1, 7, 3, 8, 9], as_str=False)
+
+    clf = make_classifier(class_hierarchy=class_hierarchy).fit(X, y)
+    classifiers = dict(clf.estimators_)
+    clf.refit_affected(X * 2, y, class_hierarchy)
+
+    for node_id in (ROOT, "A", "B"):
+        assert_that(clf.graph_.nodes[node_id][CLASSIFIER] is classifiers[node_id], is_(False))
+
+    # Data tokens supplied by the caller take precedence
+    clf.fit(X, y, data_token="v1")
+    classifiers = dict(clf.estimators_)
+    clf.refit_affected(X, y, class_hierarchy, data_token="v1")
+
+    for node_id in (ROOT, "A", "B"):
+        assert_that(clf.graph_.nodes[node_id][CLASSIFIER], is_(classifiers[node_id]))
+
+
+def test_base_estimator_dict_without_default():
+    """Test that base estimators are only looked up for nodes that are trained with one."""
+    class_hierarchy = {
+        ROOT: ["A", "B", "C"],
+        "A": [1, 5, 6, 7],
+        "B": [2, 3, 8, 9, 0],
+        "C": [4],
+    }
+    base_estimator = {
+        node_id: LogisticRegression(solver="lbfgs", max_iter=1000, multi_class="multinomial")
+        for node_id in (ROOT, "A", "B")
+    }
+    X, y = make_digits_dataset(as_str=False)
+
+    for reusable in (False, True):
+        clf = make_classifier(base_estimator=base_estimator, class_hierarchy=class_hierarchy)
+        if reusable:
+            clf.refit_affected(X, y, class_hierarchy)
+        else:
+            clf.fit(X, y)
+
+        assert_that(clf.graph_.nodes["C"][CLASSIFIER], is_(instance_of(DummyClassifier)))
+        assert_that(accuracy_score(y, clf.predict(X)), is_(close_to(1., delta=0.1)))
+
+
+def test_memory_caches_local_classifiers():
+    """Test that local classifiers are fitted from cache unless their training set or base estimator changed."""
+    class_hierarchy = {
+        ROOT: ["A", "B", "C"],
+        "A": [1, 5, 6, 7],
+        "B": [2, 3, 8, 9, 0],
+        "C": [4],
+    }
+    X, y = make_digits_dataset(as_str=False)
+
+    with TemporaryDirectory() as cachedir:
+        def n_cached():
+            return sum("output.pkl" in filenames for _, _, filenames in os.walk(cachedir))
+
+        clf = make_classifier(
+            base_estimator=LogisticRegression(max_iter=1000),
+            class_hierarchy=class_hierarchy,
+            memory=cachedir,
+        ).fit(X, y)
+        y_pred = clf.predict(X)
+        assert_that(n_cached(), is_(equal_to(4)))
+
+        clf.fit(X, y)
+        assert_that(n_cached(), is_(equal_to(4)))
+        assert_that(list(clf.predict(X)), is_(equal_to(list(y_pred))))
+        # Training data of local classifiers loaded from cache is not materialized
+        for node_id in (ROOT, "A", "B", "C"):
+            assert_that(clf.fit_stats_[node_id]["n_samples"], is_(none()))
+
+        clf.set_params(base_estimator={
+            DEFAULT: LogisticRegression(max_iter=1000),
+            "A": LogisticRegression(C=0.5, max_iter=1000),
+        }).fit(X, y)
+        assert_that(n_cached(), is_(equal_to(5)))
+
+
+def test_callbacks():
+    """Test that callbacks are called around the training and prediction of each local classifier."""
+    class RecordingCallback(NodeCallback):
+        def __init__(self):
+            self.events = []
+
+        def on_node_fit_start(self, node_id, X_shape, y_shape):
+            self.events.append(("fit_start", node_id, X_shape, y_shape))
+
+        def on_node_fit_end(self, node_id, X_shape, y_shape, elapsed):
+            self.events.append(("fit_end", node_id, X_shape, y_shape))
+
+        def on_node_predict(self, node_id, X_shape, elapsed):
+            self.events.append(("predict", node_id, X_shape))
+
+    class_hierarchy = {
+        ROOT: ["A", "B"],
+        "A": [1, 7],
+        "B": [3, 8, 9],
+    }
+    callback = RecordingCallback()
+    clf = make_classifier(
+        class_hierarchy=class_hierarchy,
+        callbacks=[callback],
+    )
+    X, y = make_digits_dataset(
+        targets=[1, 7, 3, 8, 9],
+        as_str=False,
+    )
+    clf.fit(X, y)
+
+    n_a = sum((y == 1) | (y == 7))
+    assert_that(callback.events, has_item(("fit_start", "A", (n_a, X.shape[1]), (n_a,))))
+    assert_that(
+        [event[:2] for event in callback.events],
+        is_(equal_to([
+            ("fit_start", ROOT), ("fit_end", ROOT),
+            ("fit_start", "A"), ("fit_end", "A"),
+            ("fit_start", "B"), ("fit_end", "B"),
+        ])),
+    )
+
+    callback.events = []
+    clf.predict(X)
+
+    assert_that(callback.events[0], is_(equal_to(("predict", ROOT, X.shape))))
+    assert_that([event[1] for event in callback.events[1:]], contains_inanyorder("A", "B"))
+
+    # With fused inference, local classifiers are not called individually
+    callback.events = []
+    clf.compile(fuse_linear=True).predict(X)
+
+    assert_that(callback.events, is_(equal_to([])))
+
+
+class PredictCallsRecorder(NodeCallback):
+    """Record the number of samples each local classifier is called with when predicting."""
+
+    def __init__(self):
+        self.calls = []
+
+    def on_node_predict(self, node_id, X_shape, elapsed):
+        self.calls.append((node_id, X_shape[0]))
+
+
+def test_raw_batch_predict():
+    """Test that in raw mode, each node's pipeline is invoked once for the whole batch of documents reaching it."""
+    graph = make_hierarchy(depth=2, branching=3)
+    X, y = make_text_dataset(graph, n_samples=150)
+    recorder = PredictCallsRecorder()
+    clf = make_classifier(
+        base_estimator=make_pipeline(TfidfVectorizer(), LogisticRegression()),
+        class_hierarchy=graph,
+        feature_extraction="raw",
+        callbacks=[recorder],
+    )
+    clf.fit(X, y)
+
+    y_pred = clf.predict(X)
+    calls = recorder.calls
+    recorder.calls = []
+    y_proba = clf.predict_proba(X)
+
+    # Each local classifier is called at most once, on all the documents routed to its node
+    for recorded_calls in (calls, recorder.calls):
+        nodes = [node_id for node_id, _ in recorded_calls]
+        assert_that(len(nodes), is_(equal_to(len(set(nodes)))))
+        assert_that(recorded_calls[0], is_(equal_to((ROOT, len(X)))))
+        assert_that(sum(n_samples for node_id, n_samples in recorded_calls[1:]), is_(equal_to(len(X))))
+
+    expected = [reference_predict(clf, x) for x in X]
+    assert_that(list(y_pred), is_(equal_to([path[-1] for path, _ in expected])))
+    assert_that(abs(y_proba - array([proba for _, proba in expected])).max(), is_(close_to(0., delta=1e-12)))
+
+
+def test_raw_batch_predict_multilabel():
+    """Test multi-label prediction of raw documents, batched at every node of the hierarchy."""
+    graph = make_hierarchy(depth=2, branching=3)
+    parents = {
+        child: parent
+        for parent, child in graph.edges()
+    }
+    class_hierarchy = {
+        node if node == ROOT else str(node): [str(child) for child in graph.successors(node)]
+        for node in graph
+        if graph.out_degree(node)
+    }
+    X, y = make_text_dataset(graph, n_samples=150)
+    mlb = MultiLabelBinarizer()
+    y = mlb.fit_transform([[str(label), str(parents[label])] for label in y])
+
+    recorder = PredictCallsRecorder()
+    clf = make_classifier(
+        base_estimator=make_pipeline(TfidfVectorizer(), OneVsRestClassifier(svm.LinearSVC(random_state=0))),
+        class_hierarchy=class_hierarchy,
+        feature_extraction="raw",
+        mlb=mlb,
+        use_decision_function=True,
+        callbacks=[recorder],
+    )
+    clf.fit(X, y)
+
+    paths = clf.predict(X)
+    y_proba = clf.predict_proba(X)
+
+    assert_that(paths.shape, is_(equal_to((len(X),))))
+    assert_that(y_proba.shape, is_(equal_to((len(X), len(mlb.classes_)))))
+
+    # Each local classifier is called at most once per prediction, starting with the root on all documents
+    calls = recorder.calls[:len(recorder.calls) // 2]
+    nodes = [node_id for node_id, _ in calls]
+    assert_that(len(nodes), is_(equal_to(len(set(nodes)))))
+    assert_that(calls[0], is_(equal_to((ROOT, len(X)))))
+
+    # Same paths (including the nodes visited along several predicted labels) and scores as per-sample prediction
+    expected = [reference_predict(clf, x) for x in X]
+    assert_that([list(path) for path in paths], is_(equal_to([path for path, _ in expected])))
+    assert_that(abs(y_proba - array([proba for _, proba in expected])).max(), is_(close_to(0., delta=1e-12)))
+
+
+def test_shared_feature_extractor():
+    """Test that a shared feature extractor is fitted once, and local classifiers are trained on its output."""
+    graph = make_hierarchy(depth=2, branching=3, multi_parent_rate=0.5, random_state=0)
+    X, y = make_text_dataset(graph)
+    clf = make_classifier(
+        base_estimator=LogisticRegression(),
+        class_hierarchy=graph,
+        feature_extraction="raw",
+        feature_extractor=TfidfVectorizer(),
+    )
+    clf.fit(X, y)
+
+    # Equivalent to training on pre-computed features
+    Xt = clf.feature_extractor_.transform(X)
+    expected = make_classifier(
+        base_estimator=LogisticRegression(),
+        class_hierarchy=graph,
+    ).fit(Xt, y)
+
+    assert_that(list(clf.predict(X)), is_(equal_to(list(expected.predict(Xt)))))
+    assert_that(abs(clf.predict_proba(X) - expected.predict_proba(Xt)).max(), is_(close_to(0., delta=1e-12)))
+
+    clf.compile(fuse_linear=True)
+    assert_that(list(clf.predict(X)), is_(equal_to(list(expected.predict(Xt)))))
+
+
+def test_shared_feature_extractor_requires_raw_mode():
+    X, y = make_digits_dataset()
+    clf = make_classifier(feature_extractor=TfidfVectorizer())
+
+    assert_that(calling(clf.fit).with_args(X, y), raises(TypeError))
+
+
+def test_raw_fit():
+    """Test fitting in raw mode, with pipelines trained on raw documents at every node of a tree or DAG."""
+    for multi_parent_rate in (0., 0.5):
+        graph = make_hierarchy(depth=2, branching=3, multi_parent_rate=multi_parent_rate, random_state=0)
+        X, y = make_text_dataset(graph)
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=RANDOM_STATE)
+        clf = make_classifier(
+            base_estimator=make_pipeline(TfidfVectorizer(), LogisticRegression()),
+            class_hierarchy=graph,
+            feature_extraction="raw",
+        )
+        clf.fit(X_train, y_train)
+
+        assert_that(clf.is_tree_, is_(equal_to(multi_parent_rate == 0.)))
+        assert_that(accuracy_score(y_test, clf.predict(X_test)), is_(close_to(1., delta=0.1)))
@@ -0,0 +1,74 @@
+"""
+Unit-tests for the datasets module.
+
+"""
+from hamcrest import (
+    assert_that,
+    contains_exactly,
+    equal_to,
+    greater_than,
+    is_,
+    less_than,
+)
+from networkx import is_directed_acyclic_graph, is_tree
+from numpy import array_equal, unique
+
+from sklearn_hierarchical_classification.constants import ROOT
+from sklearn_hierarchical_classification.datasets import (
+    iter_hierarchical_dataset,
+    make_hierarchical_dataset,
+    make_hierarchy,
+)
+from sklearn_hierarchical_classification.graph import terminal_nodes
+
+
+def test_make_hierarchy():
+    graph = make_hierarchy(depth=3, branching=4)
+
+    assert_that(is_tree(graph), is_(True))
+    assert_that(graph.number_of_nodes(), is_(equal_to(1 + 4 + 16 + 64)))
+    assert_that(list(graph.successors(ROOT)), contains_exactly(0, 1, 2, 3))
+    assert_that(sorted(terminal_nodes(graph)), is_(equal_to(list(range(20, 84)))))
+
+
+def test_make_skewed_hierarchy():
+    graph = make_hierarchy(depth=3, branching=4, skew=2., random_state=0)
+
+    assert_that(is_tree(graph), is_(True))
+    assert_that(graph.number_of_nodes(), is_(equal_to(1 + 4 + 16 + 64)))
+    # Some nodes above the last level end up without children
+    assert_that(min(terminal_nodes(graph)), is_(less_than(4 + 16)))
+    assert_that(max(graph.out_degree(node) for node in graph), is_(greater_than(4)))
+
+
+def test_make_dag_hierarchy():
+    graph = make_hierarchy(depth=3, branching=4, multi_parent_rate=0.5, random_state=0)
+
+    assert_that(is_tree(graph), is_(False))
+    assert_that(is_directed_acyclic_graph(graph), is_(True))
+    assert_that(max(graph.in_degree(node) for node in graph), is_(equal_to(2)))
+    assert_that(graph.in_degree(0), is_(equal_to(1)))
+
+
+def test_make_hierarchical_dataset():
+    graph = make_hierarchy(depth=2, branching=3)
+    X, y = make_hierarchical_dataset(graph, n_samples=250, chunk_size=100, n_features=50, random_state=0)
+
+    assert_that(X.shape, is_(equal_to((250, 50))))
+    assert_that(X.sum(axis=1).min(), is_(equal_to(50)))
+    assert_that(set(unique(y)), is_(equal_to(set(terminal_nodes(graph)))))
+
+    chunks = list(iter_hierarchical_dataset(graph, n_samples=250, chunk_size=100, n_features=50, random_state=0))
+    assert_that([X_.shape[0] for X_, _ in chunks], contains_exactly(100, 100, 50))
+    assert_that(array_equal(chunks[-1][1], y[200:]), is_(True))
+    assert_that((X[200:] != chunks[-1][0]).nnz, is_(equal_to(0)))
+
+
+def test_hierarchical_dataset_signal():
+    """Test that samples of sibling leaves share their parent's features."""
+    graph = make_hierarchy(depth=2, branching=2)
+    X, y = make_hierarchical_dataset(graph, n_samples=400, n_features=1000, noise=0., random_state=0)
+
+    # Leaves 2, 3 are children of node 0, leaves 4, 5 of node 1
+    features = [set(X[y == leaf].indices) for leaf in (2, 3, 4, 5)]
+    assert_that(len(features[0] & features[1]), is_(greater_than(len(features[0] & features[2]))))
@@ -0,0 +1,50 @@
+"""Unit-tests for the graph processing helpers."""
+from hamcrest import assert_that, contains_inanyorder, equal_to, is_
+from networkx import DiGraph
+
+from sklearn_hierarchical_classification.constants import ROOT
+from sklearn_hierarchical_classification.graph import HierarchyIndex, rollup_nodes
+
+
+def dag_fixture():
+    r"""Sets up a class hierarchy DAG for the graph unit-tests:
+
+              R
+            /   \
+           A     B
+          / \   /
+         1   2 /
+              3
+
+    """
+    G = DiGraph()
+    G.add_edges_from([
+        (ROOT, "A"),
+        (ROOT, "B"),
+        ("A", "1"),
+        ("A", "2"),
+        ("A", "3"),
+        ("B", "3"),
+    ])
+    return G
+
+
+def test_rollup_nodes():
+    G = dag_fixture()
+
+    resultset = rollup_nodes(G, source=ROOT, targets=["1", "3", "A", ROOT])
+
+    assert_that(resultset[0], is_(equal_to(["A"])))
+    assert_that(resultset[1], contains_inanyorder("A", "B"))
+    assert_that(resultset[2], is_(equal_to(["A"])))
+    assert_that(resultset[3], is_(equal_to([])))
+
+
+def test_rollup_nodes_with_index():
+    G = dag_fixture()
+    index = HierarchyIndex(G)
+
+    assert_that(
+        rollup_nodes(G, source="A", targets=["3", "2", "B"], index=index),
+        is_(equal_to([["3"], ["2"], []])),
+    )
@@ -1,12 +1,16 @@
 """Unit-tests for the evaluation metrics module."""
-from hamcrest import assert_that, close_to, is_
+import numpy as np
+from hamcrest import assert_that, close_to, equal_to, is_
 from inflect import engine
 from networkx import DiGraph, relabel_nodes
 from parameterized import parameterized
+from scipy.sparse import csr_matrix, issparse
 
 from sklearn_hierarchical_classification.constants import ROOT
 from sklearn_hierarchical_classification.metrics import (
+    fill_ancestors,
     h_fbeta_score,
+    h_precision_recall_fscore_support,
     h_precision_score,
     h_recall_score,
     multi_labeled,
@@ -157,3 +161,91 @@ def test_h_scores(graph, y_true, y_pred, expected_hr_score, expected_hp_score, e
             h_fbeta_score(y_true=y_true_, y_pred=y_pred_, class_hierarchy=graph_),
             is_(close_to(expected_hf1_score, delta=0.0001)),
         )
+
+
+@parameterized(METRICS_TEST_CASES)
+def test_h_scores_sparse(graph, y_true, y_pred, expected_hr_score, expected_hp_score, expected_hf1_score):
+    """Test the hR, hP, hF1 metrics accept sparse multi-label targets."""
+    with multi_labeled(y_true, y_pred, graph) as (y_true_, y_pred_, graph_):
+        y_true_, y_pred_ = csr_matrix(y_true_), csr_matrix(y_pred_)
+        assert_that(
+            h_recall_score(y_true=y_true_, y_pred=y_pred_, class_hierarchy=graph_),
+            is_(close_to(expected_hr_score, delta=0.0001)),
+        )
+        assert_that(
+            h_precision_score(y_true=y_true_, y_pred=y_pred_, class_hierarchy=graph_),
+            is_(close_to(expected_hp_score, delta=0.0001)),
+        )
+        assert_that(
+            h_fbeta_score(y_true=y_true_, y_pred=y_pred_, class_hierarchy=graph_),
+            is_(close_to(expected_hf1_score, delta=0.0001)),
+        )
+
+
+def test_fill_ancestors():
+    """Test that ancestors of every label are filled in, for both dense and sparse targets."""
+    y = np.array([
+        [0, 0, 0, 0, 0, 0, 1],
+        [1, 0, 0, 1, 0, 0, 0],
+    ])
+    expected = [
+        [0, 1, 1, 0, 0, 1, 1],
+        [1, 1, 0, 1, 0, 0, 0],
+    ]
+
+    y_ = fill_ancestors(y, graph=graph_fixture(), root=ROOT)
+    y_sparse_ = fill_ancestors(csr_matrix(y), graph=graph_fixture(), root=ROOT)
+
+    assert_that(y_.tolist(), is_(equal_to(expected)))
+    assert_that(issparse(y_sparse_), is_(True))
+    assert_that(y_sparse_.toarray().tolist(), is_(equal_to(expected)))
+
+
+@parameterized(METRICS_TEST_CASES)
+def test_h_precision_recall_fscore_support(
+    graph,
+    y_true,
+    y_pred,
+    expected_hr_score,
+    expected_hp_score,
+    expected_hf1_score,
+):
+    """Test computing the micro-averaged hP, hR, hF1 metrics together."""
+    with multi_labeled(y_true, y_pred, graph) as (y_true_, y_pred_, graph_):
+        hP, hR, hF, support = h_precision_recall_fscore_support(y_true_, y_pred_, graph_)
+
+        assert_that(hR, is_(close_to(expected_hr_score, delta=0.0001)))
+        assert_that(hP, is_(close_to(expected_hp_score, delta=0.0001)))
+        assert_that(hF, is_(close_to(expected_hf1_score, delta=0.0001)))
+        assert_that(support, is_(None))
+
+
+def test_h_precision_recall_fscore_support_per_class():
+    """Test the per-class and macro-averaged hP, hR, hF1 metrics."""
+    # y_true: [[4]] -> {4, 2, 1} once ancestors are filled in
+    # y_pred: [[3]] -> {3, 1} once ancestors are filled in
+    y_true = np.array([[0, 0, 0, 0, 1, 0, 0]])
+    y_pred = np.array([[0, 0, 0, 1, 0, 0, 0]])
+
+    hP, hR, hF, support = h_precision_recall_fscore_support(
+        y_true,
+        y_pred,
+        graph_fixture(),
+        average=None,
+    )
+
+    assert_that(hP.tolist(), is_(equal_to([0., 1., 0., 0., 0., 0., 0.])))
+    assert_that(hR.tolist(), is_(equal_to([0., 1., 0., 0., 0., 0., 0.])))
+    assert_that(hF.tolist(), is_(equal_to([0., 1., 0., 0., 0., 0., 0.])))
+    assert_that(support.tolist(), is_(equal_to([0, 1, 1, 0, 1, 0, 0])))
+
+    hP, hR, hF, support = h_precision_recall_fscore_support(
+        y_true,
+        y_pred,
+        graph_fixture(),
+        average="macro",
+    )
+
+    assert_that(hP, is_(close_to(1. / 7, delta=0.0001)))
+    assert_that(hR, is_(close_to(1. / 7, delta=0.0001)))
+    assert_that(hF, is_(close_to(1. / 7, delta=0.0001)))
@@ -0,0 +1,96 @@
+"""
+Unit-tests for the persistence module.
+
+"""
+import os
+from tempfile import TemporaryDirectory
+
+from hamcrest import (
+    assert_that,
+    calling,
+    equal_to,
+    has_key,
+    instance_of,
+    is_,
+    is_not,
+    raises,
+)
+from joblib import dump
+from numpy import allclose, memmap
+from sklearn.exceptions import NotFittedError
+from sklearn.svm import LinearSVC
+
+from sklearn_hierarchical_classification.classifier import HierarchicalClassifier
+from sklearn_hierarchical_classification.constants import CLASSIFIER, ROOT, TRAINING_ROWS
+from sklearn_hierarchical_classification.persistence import load, save
+from sklearn_hierarchical_classification.tests.fixtures import make_classifier_and_data
+from sklearn_hierarchical_classification.tests.matchers import matches_graph
+
+
+def test_save_and_load():
+    clf, (X, y) = make_classifier_and_data()
+    clf.fit(X, y)
+
+    with TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "model.joblib")
+        clf.save(path)
+        loaded_clf = HierarchicalClassifier.load(path)
+
+        assert_that(loaded_clf.graph_, matches_graph(clf.graph_))
+        assert_that(loaded_clf.classes_, is_(equal_to(clf.classes_)))
+        assert_that(loaded_clf.graph_.nodes[ROOT], is_not(has_key(TRAINING_ROWS)))
+        assert_that(loaded_clf.graph_.nodes[ROOT][CLASSIFIER].coef_, is_(instance_of(memmap)))
+
+        assert_that(list(loaded_clf.predict(X)), is_(equal_to(list(clf.predict(X)))))
+        assert_that(allclose(loaded_clf.predict_proba(X), clf.predict_proba(X)), is_(True))
+
+
+def test_save_and_load_with_fused_inference():
+    clf, (X, y) = make_classifier_and_data()
+    clf.fit(X, y).compile(fuse_linear=True)
+
+    with TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "model.joblib")
+        save(clf, path)
+        loaded_clf = load(path)
+
+        plan = loaded_clf.plan_
+        assert_that(plan.fused.coef, is_(instance_of(memmap)))
+        assert_that(plan.fused.intercept, is_(instance_of(memmap)))
+        assert_that(plan.local_indptr, is_(instance_of(memmap)))
+        assert_that(plan.classifiers[plan.classifier_slot[plan.root]], is_(loaded_clf.graph_.nodes[ROOT][CLASSIFIER]))
+
+        assert_that(list(loaded_clf.predict(X)), is_(equal_to(list(clf.predict(X)))))
+        assert_that(allclose(loaded_clf.predict_proba(X), clf.predict_proba(X)), is_(True))
+
+
+def test_save_and_load_in_memory_with_fused_inference():
+    clf, (X, y) = make_classifier_and_data(
+        base_estimator=LinearSVC(),
+        use_decision_function=True,
+    )
+    clf.fit(X, y).compile(fuse_linear=True)
+
+    with TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "model.joblib")
+        save(clf, path)
+        loaded_clf = load(path, mmap_mode=None)
+
+    assert_that(loaded_clf.plan_.fused, is_not(None))
+    assert_that(loaded_clf.graph_.nodes[ROOT][CLASSIFIER].coef_, is_not(instance_of(memmap)))
+    assert_that(list(loaded_clf.predict(X)), is_(equal_to(list(clf.predict(X)))))
+
+
+def test_save_requires_fitted_classifier():
+    clf, _ = make_classifier_and_data()
+
+    with TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "model.joblib")
+        assert_that(calling(clf.save).with_args(path), raises(NotFittedError))
+
+
+def test_load_checks_format_version():
+    with TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "model.joblib")
+        dump(dict(format_version=0), path)
+        assert_that(calling(load).with_args(path), raises(ValueError))
@@ -0,0 +1,75 @@
+"""
+Unit-tests for the stats module.
+
+"""
+import tracemalloc
+from io import StringIO
+
+from hamcrest import (
+    assert_that,
+    contains_exactly,
+    equal_to,
+    greater_than,
+    has_entries,
+    is_,
+    none,
+)
+from numpy import array
+from scipy.sparse import csr_matrix
+
+from sklearn_hierarchical_classification.stats import NodeStats, data_stats, measure
+
+
+def test_node_stats():
+    stats = NodeStats(fields=("n_calls", "predict_time"))
+    stats.add("A", n_calls=1, predict_time=0.5)
+    stats.add("A", n_calls=1, predict_time=0.25)
+    stats.set("B", n_calls=3)
+
+    assert_that(stats.to_dict(), is_(equal_to({
+        "A": dict(n_calls=2, predict_time=0.75),
+        "B": dict(n_calls=3, predict_time=None),
+    })))
+    assert_that(stats.top("n_calls"), contains_exactly("B", "A"))
+    assert_that(stats.top("predict_time"), contains_exactly("A"))
+
+
+def test_node_stats_to_csv():
+    stats = NodeStats(fields=("n_calls", "predict_time"))
+    stats.add("A", n_calls=2, predict_time=0.5)
+    stats.set("B", n_calls=3)
+
+    buf = StringIO()
+    stats.to_csv(buf)
+
+    assert_that(buf.getvalue().splitlines(), contains_exactly(
+        "node,n_calls,predict_time",
+        "A,2,0.5",
+        "B,3,",
+    ))
+
+
+def test_data_stats():
+    X = array([[0, 1, 2], [0, 0, 3]])
+    y = array([1, 2])
+
+    assert_that(data_stats(X, y), has_entries(n_samples=2, n_features=3, nnz=3, data_nbytes=X.nbytes + y.nbytes))
+    assert_that(data_stats(csr_matrix(X), y), has_entries(n_samples=2, n_features=3, nnz=3))
+    assert_that(data_stats(["some text", "more text"], y), is_(equal_to(dict(n_samples=2))))
+
+
+def test_measure():
+    tracemalloc.start()
+    try:
+        with measure() as stats:
+            buf = bytearray(1 << 20)
+        with measure(trace_memory=False) as untraced_stats:
+            buf = bytearray(1 << 20)
+    finally:
+        tracemalloc.stop()
+
+    assert_that(len(buf), is_(equal_to(1 << 20)))
+    assert_that(stats["time"], is_(greater_than(0)))
+    assert_that(stats["peak_memory"], is_(greater_than(1 << 19)))
+    assert_that(untraced_stats["time"], is_(greater_than(0)))
+    assert_that(untraced_stats["peak_memory"], is_(none()))
@@ -37,6 +37,13 @@ def test_parameter_validation():
         dict(
             algorithm="some_invalid_algorithm_value",
         ),
+        dict(
+            proba_mode="some_invalid_proba_mode",
+        ),
+        dict(
+            proba_mode="marginal",
+            use_decision_function=True,
+        ),
     ]
 
     for classifier_kwargs in test_cases:
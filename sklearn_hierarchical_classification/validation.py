@@ -3,6 +3,7 @@ from sklearn_hierarchical_classification.constants import (
     VALID_ALGORITHM,
     VALID_FEATURE_EXTRACTION,
     VALID_PREDICTION_DEPTH,
+    VALID_PROBA_MODE,
     VALID_TRAINING_STRATEGY,
 )
 
@@ -69,6 +70,29 @@ class ParameterValidator(object):
                 )
             )
 
+        if self.feature_extractor is not None:
+            if self.feature_extraction != "raw":
+                raise TypeError(
+                    """'feature_extractor' should only be specified when 'feature_extraction' is set to "raw"."""
+                )
+            if not all(hasattr(self.feature_extractor, method) for method in ("fit_transform", "transform")):
+                raise TypeError(
+                    "'feature_extractor' must be a transformer implementing 'fit_transform' and 'transform'."
+                )
+
+        if self.proba_mode not in VALID_PROBA_MODE:
+            raise TypeError(
+                "'proba_mode' must be set to one of: {}.".format(
+                    ", ".join(VALID_PROBA_MODE),
+                )
+            )
+
+        if self.proba_mode == "marginal" and (self.mlb is not None or self.use_decision_function):
+            raise TypeError(
+                """When 'proba_mode' is set to "marginal", local classifiers must report probability
+                estimates for a single label, i.e 'mlb' and 'use_decision_function' should not be specified."""
+            )
+
 
 def validate_parameters(instance):
     return ParameterValidator(instance)()